@@ -0,0 +1,86 @@
+"""
+Compares the throughput of per-utterance and batched intent classification.
+
+    python -m benchmarks.batch_inference --lang en --texts utterances.txt
+
+``--texts`` holds one utterance per line. Without it, the training utterances
+kept by the lookup index are used. The batched probabilities are checked
+against the per-utterance ones.
+"""
+
+import itertools
+import time
+from typing import List, Optional
+
+import numpy as np
+import typer
+
+from src.models import Lang
+
+
+def _texts(kit, path: Optional[str]) -> List[str]:
+    if path is not None:
+        with open(path, encoding="utf8") as f:
+            return [line.strip() for line in f if line.strip()]
+    if kit.lookup is None or not kit.lookup.exact:
+        raise typer.BadParameter("No utterances to benchmark, give --texts")
+    return list(kit.lookup.exact)
+
+
+def _classifier(engine):
+    from snips_nlu.intent_parser import ProbabilisticIntentParser
+
+    for parser in engine.intent_parsers:
+        if isinstance(parser, ProbabilisticIntentParser):
+            return parser.intent_classifier
+    raise typer.BadParameter("The engine has no probabilistic intent parser")
+
+
+def main(
+    lang: Lang = Lang.EN,
+    texts: Optional[str] = None,
+    sizes: str = "1,8,32,128,512",
+    runs: int = 3,
+):
+    from src.batch import classify_batch
+    from src.kit import IntentKit
+
+    kit = IntentKit(lang)
+    kit.reuse()
+    classifier = _classifier(kit.engine)
+    corpus = _texts(kit, texts)
+
+    single = [classifier.get_intent(text) for text in corpus]
+    batched = classify_batch(classifier, corpus)
+    error = max(
+        abs(a["probability"] - b["probability"]) for a, b in zip(single, batched)
+    )
+    mismatches = sum(
+        a["intentName"] != b["intentName"] for a, b in zip(single, batched)
+    )
+    typer.echo(f"max probability error {error:.2e}, intent mismatches {mismatches}")
+
+    typer.echo(
+        f"{'batch':>8}{'single (utt/s)':>18}{'batched (utt/s)':>18}{'speedup':>10}"
+    )
+    for size in (int(s) for s in sizes.split(",")):
+        batch = list(itertools.islice(itertools.cycle(corpus), size))
+        single_times, batched_times = [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            for text in batch:
+                classifier.get_intent(text)
+            single_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            classify_batch(classifier, batch)
+            batched_times.append(time.perf_counter() - start)
+        single_rate = size / np.median(single_times)
+        batched_rate = size / np.median(batched_times)
+        typer.echo(
+            f"{size:>8}{single_rate:>18.0f}{batched_rate:>18.0f}"
+            f"{batched_rate / single_rate:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,97 @@
+"""
+A local stand-in for the Gemini streamGenerateContent endpoint, answering
+every prompt with a one action plan after a simulated generation time.
+
+    python -m benchmarks.gemini_standin --port 8765 --latency-ms 400
+    GEMINI_ENDPOINT=http://127.0.0.1:8765/v1beta/models/{model}:streamGenerateContent
+
+The plan is streamed as server-sent events in a few chunks, like Gemini
+does with ``alt=sse``. ``--error-rate`` of the requests fail with a 503.
+"""
+
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import typer
+
+ENDPOINT = "http://{host}:{port}/v1beta/models/{{model}}:streamGenerateContent"
+
+
+def _plan(text: str) -> str:
+    return json.dumps(
+        {
+            "actions": [
+                {
+                    "id": "answer",
+                    "function": "say",
+                    "args": {"text": f"I can't help with '{text}' yet."},
+                }
+            ]
+        }
+    )
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    latency: float = 0.4
+    jitter: float = 0.1
+    error_rate: float = 0.0
+    chunks: int = 3
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if random.random() < self.error_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        text = json.loads(body)["contents"][0]["parts"][0]["text"]
+        plan = _plan(text)
+        size = -(-len(plan) // self.chunks)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(plan), size):
+            time.sleep(max(0.0, random.gauss(self.latency, self.jitter)) / self.chunks)
+            event = {
+                "candidates": [
+                    {"content": {"parts": [{"text": plan[start : start + size]}]}}
+                ]
+            }
+            self._chunk(f"data: {json.dumps(event)}\r\n\r\n".encode("utf8"))
+        self._chunk(b"")
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(host: str, port: int, latency_ms: float, jitter_ms: float, error_rate: float):
+    StandInHandler.latency = latency_ms / 1000
+    StandInHandler.jitter = jitter_ms / 1000
+    StandInHandler.error_rate = error_rate
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def main(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    latency_ms: float = 400,
+    jitter_ms: float = 100,
+    error_rate: float = 0.0,
+):
+    typer.echo(f"GEMINI_ENDPOINT={ENDPOINT.format(host=host, port=port)}")
+    run(host, port, latency_ms, jitter_ms, error_rate)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,67 @@
+"""
+Compares the load time and memory of the JSON and packed engine formats.
+
+    python -m benchmarks.load_engine --lang en --runs 5
+
+Every load runs in a fresh process so that nothing is shared between runs.
+The engine is packed first when it was not already.
+"""
+
+import multiprocessing
+import statistics
+import time
+
+import typer
+
+from src.models import Lang
+
+
+def _load(format: str, path: str, queue):
+    from snips_nlu import SnipsNLUEngine
+
+    from src.packed import load_packed
+    from src.profiler import peak_rss
+
+    before = peak_rss() or 0
+    start = time.perf_counter()
+    if format == "json":
+        engine = SnipsNLUEngine.from_path(path)
+    else:
+        engine = load_packed(path)
+    loaded = time.perf_counter() - start
+    engine.parse("hello")
+    first_parse = time.perf_counter() - start - loaded
+    queue.put((loaded, first_parse, (peak_rss() or 0) - before))
+
+
+def measure(format: str, path: str) -> tuple:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_load, args=(format, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main(lang: Lang = Lang.EN, runs: int = 5):
+    from src.kit import IntentKit
+    from src.packed import is_packed
+
+    kit = IntentKit(lang)
+    if not is_packed(kit.packed_path):
+        kit.pack()
+
+    typer.echo(f"{'format':<8}{'load (s)':>12}{'first parse (s)':>18}{'rss (MiB)':>12}")
+    for format, path in (("json", kit.engine_path), ("packed", kit.packed_path)):
+        results = [measure(format, path) for _ in range(runs)]
+        load, parse, rss = zip(*results)
+        typer.echo(
+            f"{format:<8}{statistics.median(load):>12.3f}"
+            f"{statistics.median(parse):>18.3f}"
+            f"{statistics.median(rss) / 2**20:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
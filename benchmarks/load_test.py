@@ -0,0 +1,304 @@
+"""
+Load test of the HTTP API, with the AI fallback answered by a local Gemini
+stand-in instead of the real endpoint.
+
+    python -m benchmarks.load_test --lang en --rates 10,50,100 --duration 30
+
+Starts the stand-in and the server of ``src/app.py`` with the trained engine
+of ``--lang``, then sends requests at each rate for ``--duration`` seconds.
+Requests are sent open-loop: they are due at a Poisson arrival time whatever
+the responses take, and their latency counts from that time, so that a slow
+server shows up as a growing latency instead of a lower rate.
+
+High confidence texts are the training utterances kept by the lookup index
+of the engine, or ``--texts``. Low confidence texts are made of words the
+engine never saw, or ``--low-texts``; whether they fall back to the AI is up
+to the engine, and the share that did is reported.
+"""
+
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+import typer
+
+from src.models import Lang
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def _lines(path: str) -> List[str]:
+    with open(path, encoding="utf8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _high_texts(lang: Lang, path: Optional[str]) -> List[str]:
+    if path is not None:
+        return _lines(path)
+    from src.kit import IntentKit
+    from src.lookup import LOOKUP_FILE
+
+    index = f"{IntentKit(lang).engine_path}/{LOOKUP_FILE}"
+    if not os.path.exists(index):
+        raise typer.BadParameter("No training utterances to send, give --texts")
+    with open(index, encoding="utf8") as f:
+        return list(json.load(f)["exact"])
+
+
+def _low_texts(lang: Lang, path: Optional[str], count: int = 500) -> List[str]:
+    if path is not None:
+        return _lines(path)
+    from benchmarks.synthetic import SyntheticDataset
+
+    return SyntheticDataset(lang, intents=count, entities=0).texts(count)
+
+
+def _start_server(lang: Lang, port: int, workers: int, endpoint: str):
+    env = dict(os.environ, GEMINI_ENDPOINT=endpoint, GEMINI_API_KEY="stand-in")
+    code = (
+        "from src.app import serve; from src.models import Lang; "
+        f"serve(Lang({lang.value!r}), '127.0.0.1', {port}, False, {workers})"
+    )
+    return subprocess.Popen(
+        [sys.executable, "-c", code],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _wait_until_alive(url: str, server: subprocess.Popen, timeout: float = 300) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            return requests.get(f"{url}/avi/alive", timeout=1).json()
+        except requests.RequestException:
+            time.sleep(0.5)
+    typer.secho("The server did not start", fg=typer.colors.RED, err=True)
+    raise typer.Exit(1)
+
+
+class Sample:
+    __slots__ = ("endpoint", "status", "latency", "lag", "texts", "ai")
+
+    def __init__(
+        self,
+        endpoint: str,
+        status: str,
+        latency: float,
+        lag: float,
+        texts: int,
+        ai: int,
+    ):
+        self.endpoint = endpoint
+        self.status = status
+        self.latency = latency
+        self.lag = lag
+        self.texts = texts
+        self.ai = ai
+
+
+def _send(url: str, endpoint: str, texts: List[str], due: float, lag: float):
+    ai = 0
+    try:
+        if endpoint == "recognize":
+            response = _session().get(
+                f"{url}/intent_recognition/", params={"text": texts[0]}, timeout=120
+            )
+        else:
+            response = _session().post(
+                f"{url}/intent_recognition/batch", json={"texts": texts}, timeout=120
+            )
+        status = str(response.status_code)
+        if response.status_code == 200:
+            body = response.json()
+            results = [body] if endpoint == "recognize" else body["results"]
+            ai = sum(r["processor"] == "ai" for r in results)
+    except requests.RequestException as e:
+        status = type(e).__name__
+    return Sample(endpoint, status, time.perf_counter() - due, lag, len(texts), ai)
+
+
+def drive(
+    url: str,
+    rate: float,
+    duration: float,
+    high: List[str],
+    low: List[str],
+    low_share: float,
+    batch_share: float,
+    batch_size: int,
+    threads: int,
+    seed: int,
+) -> List[Sample]:
+    """Sends Poisson arrivals at ``rate`` requests per second, open-loop."""
+    rng = random.Random(seed)
+
+    def text() -> str:
+        return rng.choice(low if rng.random() < low_share else high)
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        due = start
+        while True:
+            due += rng.expovariate(rate)
+            if due - start > duration:
+                break
+            if rng.random() < batch_share:
+                endpoint, texts = "batch", [text() for _ in range(batch_size)]
+            else:
+                endpoint, texts = "recognize", [text()]
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            lag = max(0.0, -wait)
+            futures.append(pool.submit(_send, url, endpoint, texts, due, lag))
+    return [future.result() for future in futures]
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def summarize(samples: List[Sample], duration: float) -> Dict[str, dict]:
+    """Throughput, latency and errors of every endpoint."""
+    report = {}
+    for endpoint in sorted({s.endpoint for s in samples}):
+        chosen = [s for s in samples if s.endpoint == endpoint]
+        ok = [s for s in chosen if s.status == "200"]
+        latencies = [s.latency * 1000 for s in ok] or [0.0]
+        errors: Dict[str, int] = {}
+        for sample in chosen:
+            if sample.status != "200":
+                errors[sample.status] = errors.get(sample.status, 0) + 1
+        texts = sum(s.texts for s in ok)
+        report[endpoint] = {
+            "requests": len(chosen),
+            "throughput_rps": len(ok) / duration,
+            "texts_per_s": texts / duration,
+            "error_rate": (len(chosen) - len(ok)) / len(chosen),
+            "errors": errors,
+            "ai_share": sum(s.ai for s in ok) / texts if texts else 0.0,
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+            "max_ms": max(latencies),
+            "mean_ms": statistics.mean(latencies),
+            "client_lag_ms": max(s.lag for s in chosen) * 1000,
+        }
+    return report
+
+
+def main(
+    lang: Lang = Lang.EN,
+    rates: str = "10,25,50",
+    duration: float = 30,
+    workers: int = 1,
+    port: int = 8178,
+    texts: Optional[str] = None,
+    low_texts: Optional[str] = None,
+    low_share: float = 0.2,
+    batch_share: float = 0.0,
+    batch_size: int = 16,
+    llm_port: int = 8765,
+    llm_latency_ms: float = 400,
+    llm_jitter_ms: float = 100,
+    llm_error_rate: float = 0.0,
+    threads: int = 256,
+    seed: int = 42,
+    output: Optional[str] = None,
+):
+    from benchmarks import gemini_standin
+
+    high = _high_texts(lang, texts)
+    low = _low_texts(lang, low_texts)
+    url = f"http://127.0.0.1:{port}"
+
+    context = multiprocessing.get_context("spawn")
+    standin = context.Process(
+        target=gemini_standin.run,
+        args=("127.0.0.1", llm_port, llm_latency_ms, llm_jitter_ms, llm_error_rate),
+        daemon=True,
+    )
+    standin.start()
+    endpoint = gemini_standin.ENDPOINT.format(host="127.0.0.1", port=llm_port)
+    server = _start_server(lang, port, workers, endpoint)
+    results = []
+    try:
+        if not _wait_until_alive(url, server)["intent_kit"]:
+            response = requests.post(
+                f"{url}/intent_recognition/engine", params={"type": "reuse"}
+            )
+            if response.status_code != 200:
+                raise typer.BadParameter(f"No {lang.value} engine: {response.text}")
+
+        typer.echo(
+            f"{'rate':>6} {'endpoint':<10}{'req/s':>8}{'errors':>8}{'ai':>6}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        )
+        for n, rate in enumerate(float(r) for r in rates.split(",")):
+            samples = drive(
+                url,
+                rate,
+                duration,
+                high,
+                low,
+                low_share,
+                batch_share,
+                batch_size,
+                threads,
+                seed + n,
+            )
+            report = summarize(samples, duration)
+            results.append({"rate": rate, "endpoints": report})
+            for name, r in report.items():
+                typer.echo(
+                    f"{rate:>6.0f} {name:<10}{r['throughput_rps']:>8.1f}"
+                    f"{r['error_rate']:>8.1%}{r['ai_share']:>6.0%}{r['p50_ms']:>9.1f}"
+                    f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}"
+                )
+                if r["client_lag_ms"] > 50:
+                    typer.echo(
+                        f"       the client fell {r['client_lag_ms']:.0f} ms behind"
+                        " schedule, give more --threads",
+                        err=True,
+                    )
+    finally:
+        server.terminate()
+        server.wait()
+        standin.terminate()
+
+    if output is not None:
+        params = {
+            "lang": lang.value,
+            "duration": duration,
+            "workers": workers,
+            "low_share": low_share,
+            "batch_share": batch_share,
+            "batch_size": batch_size,
+            "llm_latency_ms": llm_latency_ms,
+            "llm_error_rate": llm_error_rate,
+        }
+        with open(output, "w", encoding="utf8") as f:
+            json.dump({"params": params, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,120 @@
+"""
+Measures the time per request of the recognition routes with the results
+validated against the response models, as in debug mode, and without.
+
+    python -m benchmarks.serialization --requests 2000 --slots 4
+
+The routes of ``src/app.py`` are called in process, with a kit that returns
+canned engine results of ``--slots`` slots, so the difference between the
+two modes is the validation and serialization of the response alone.
+"""
+
+import statistics
+import time
+from typing import Dict, List
+
+import typer
+
+from src.models import Processor
+
+
+def engine_result(text: str, slots: int) -> dict:
+    """An engine result shaped like the ones of snips, with ``slots`` slots."""
+    return {
+        "input": text,
+        "intent": {"intentName": "turn_on", "probability": 0.93},
+        "slots": [
+            {
+                "range": {"start": 5 * n, "end": 5 * n + 4},
+                "rawValue": f"val{n}",
+                "value": {"kind": "Custom", "value": f"value {n}"},
+                "entity": f"entity_{n}",
+                "slotName": f"slot_{n}",
+            }
+            for n in range(slots)
+        ],
+        "kind": "nlu",
+    }
+
+
+class CannedKit:
+    """Answers every text with the same engine result."""
+
+    loaded = True
+    entity_cache = None
+
+    def __init__(self, slots: int):
+        self.slots = slots
+
+    def parse(self, text):
+        return engine_result(text, self.slots), Processor.ENGINE
+
+    def parse_batch(self, texts: List[str]):
+        return [self.parse(text) for text in texts]
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def measure(client, validate: bool, requests: int, batch_size: int) -> Dict[str, dict]:
+    from src.config import api
+
+    api["VALIDATE_RESPONSES"] = validate
+    calls = {
+        "recognize": lambda: client.get(
+            "/intent_recognition/", params={"text": "turn on the lights"}
+        ),
+        "batch": lambda: client.post(
+            "/intent_recognition/batch",
+            json={"texts": ["turn on the lights"] * batch_size},
+        ),
+    }
+    report = {}
+    for name, call in calls.items():
+        for _ in range(min(100, requests)):
+            call()
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = call()
+            latencies.append((time.perf_counter() - start) * 1e6)
+            response.raise_for_status()
+        report[name] = {
+            "mean_us": statistics.mean(latencies),
+            "p50_us": _percentile(latencies, 50),
+            "p99_us": _percentile(latencies, 99),
+        }
+    return report
+
+
+def main(
+    requests: int = 2000,
+    slots: int = 4,
+    batch_size: int = 16,
+):
+    from fastapi.testclient import TestClient
+
+    from src.app import app
+    from src.serialization import orjson
+
+    app.state.intentKit = CannedKit(slots)
+    client = TestClient(app)
+    validated = measure(client, True, requests, batch_size)
+    fast = measure(client, False, requests, batch_size)
+
+    typer.echo(f"encoder: {'orjson' if orjson is not None else 'json'}")
+    typer.echo(
+        f"{'route':<12}{'validated us':>14}{'fast us':>10}{'saved us':>10}{'saved':>8}"
+    )
+    for name in validated:
+        before, after = validated[name]["p50_us"], fast[name]["p50_us"]
+        typer.echo(
+            f"{name:<12}{before:>14.0f}{after:>10.0f}{before - after:>10.0f}"
+            f"{(before - after) / before:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
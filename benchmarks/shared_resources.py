@@ -0,0 +1,56 @@
+"""
+Measures the memory of loading an engine several times, with and without
+the resources and builtin entity parsers shared by the resource manager.
+
+    python -m benchmarks.shared_resources --lang en --copies 4
+
+Every measure runs in a fresh process so that nothing is shared between them.
+"""
+
+import multiprocessing
+
+import typer
+
+from src.models import Lang
+
+
+def _load(path: str, copies: int, shared: bool, queue):
+    from snips_nlu import SnipsNLUEngine
+
+    from src.packed import is_packed, load_packed
+    from src.profiler import peak_rss
+    from src.resources import ResourceManager
+
+    manager = ResourceManager()
+    load = load_packed if is_packed(path) else SnipsNLUEngine.from_path
+    before = peak_rss() or 0
+    engines = [
+        load(path, **(manager.shared(path) if shared else {})) for _ in range(copies)
+    ]
+    queue.put(((peak_rss() or 0) - before, len(engines)))
+
+
+def measure(path: str, copies: int, shared: bool) -> int:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_load, args=(path, copies, shared, queue))
+    process.start()
+    growth, _ = queue.get()
+    process.join()
+    return growth
+
+
+def main(lang: Lang = Lang.EN, copies: int = 4, packed: bool = False):
+    from src.kit import IntentKit
+
+    kit = IntentKit(lang)
+    path = kit.packed_path if packed else kit.engine_path
+
+    typer.echo(f"{'loading':<10}{'rss (MiB)':>12}")
+    for label, shared in (("separate", False), ("shared", True)):
+        growth = measure(path, copies, shared)
+        typer.echo(f"{label:<10}{growth / 2**20:>12.1f}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,222 @@
+"""
+Measures the training time, the cold load time of ``reuse()``, the parse
+latency and the peak memory of IntentKit on a synthetic dataset.
+
+    python -m benchmarks.suite --lang en --intents 50 --output results.json
+    python -m benchmarks.suite --lang en --intents 50 --baseline results.json
+
+The engine is trained in a temporary directory, with an empty training
+cache, so runs are comparable. Each step runs in a fresh process and the
+load and parse steps are repeated ``--runs`` times, keeping the medians.
+Texts the engine would hand to the AI fallback are counted instead of sent.
+
+With ``--baseline``, every measure is compared with the one of a previous
+run and the command fails when one is slower by more than ``--tolerance``.
+"""
+
+import json
+import multiprocessing
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+import typer
+
+from src.models import Lang
+
+# Lower is better for every measure
+MEASURES = {
+    "train_s": "s",
+    "train_peak_rss": "MiB",
+    "load_s": "s",
+    "load_peak_rss": "MiB",
+    "parse_p50_ms": "ms",
+    "parse_p95_ms": "ms",
+    "parse_p99_ms": "ms",
+}
+
+
+def _percentile(values, percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _isolate(workdir: str):
+    """Points the caches of the process to the benchmark directory."""
+    from src.config import inference, training
+
+    training["CACHE_PATH"] = f"{workdir}/training.sqlite"
+    inference["BUILTIN_CACHE_PATH"] = f"{workdir}/builtin_entities"
+
+
+def _kit(params: dict, workdir: str):
+    from src.kit import IntentKit
+
+    kit = IntentKit(Lang(params["lang"]))
+    kit.engine_path = f"{workdir}/engine"
+    return kit
+
+
+def _train(params: dict, workdir: str, queue):
+    from benchmarks.synthetic import SyntheticDataset
+    from src.profiler import peak_rss
+
+    _isolate(workdir)
+    dataset = SyntheticDataset(**params).dataset()
+    kit = _kit(params, workdir)
+    kit.populate(dataset)
+    start = time.perf_counter()
+    kit.train()
+    queue.put({"train_s": time.perf_counter() - start, "train_peak_rss": peak_rss()})
+
+
+def _load_and_parse(params: dict, workdir: str, texts: int, queue):
+    import src.kit
+    from benchmarks.synthetic import SyntheticDataset
+    from snips_nlu.result import empty_result
+    from src.profiler import peak_rss
+
+    _isolate(workdir)
+    fallbacks = []
+
+    def generate(text):
+        fallbacks.append(text)
+        return empty_result(text, 0.0)
+
+    src.kit.generate = generate
+    kit = _kit(params, workdir)
+    start = time.perf_counter()
+    kit.reuse()
+    load_s = time.perf_counter() - start
+    load_peak_rss = peak_rss()
+
+    # Other seed than the training utterances
+    corpus = SyntheticDataset(**dict(params, seed=params["seed"] + 1)).texts(texts)
+    for text in corpus[:10]:
+        kit.parse(text)
+    fallbacks.clear()
+    latencies = []
+    for text in corpus:
+        start = time.perf_counter()
+        kit.parse(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+    queue.put(
+        {
+            "load_s": load_s,
+            "load_peak_rss": load_peak_rss,
+            "parse_p50_ms": _percentile(latencies, 50),
+            "parse_p95_ms": _percentile(latencies, 95),
+            "parse_p99_ms": _percentile(latencies, 99),
+            "fallbacks": len(fallbacks),
+        }
+    )
+
+
+def _run(target, *args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=target, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def environment() -> dict:
+    from importlib.metadata import PackageNotFoundError, version
+
+    from src.config import __version__
+
+    try:
+        snips = version("snips-nlu")
+    except PackageNotFoundError:
+        snips = None
+    return {
+        "avi_nlu": __version__,
+        "snips_nlu": snips,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float):
+    """The measures slower than the baseline by more than ``tolerance``."""
+    return [
+        name
+        for name in MEASURES
+        if results.get(name) is not None
+        and baseline.get(name)
+        and results[name] > baseline[name] * (1 + tolerance)
+    ]
+
+
+def _show(value: Optional[float], unit: str) -> str:
+    if value is None:
+        return "-"
+    return f"{value / 2**20:.1f}" if unit == "MiB" else f"{value:.3f}"
+
+
+def main(
+    lang: Lang = Lang.EN,
+    intents: int = 20,
+    utterances: int = 20,
+    entities: int = 5,
+    entity_values: int = 50,
+    seed: int = 42,
+    texts: int = 500,
+    runs: int = 3,
+    output: Optional[str] = None,
+    baseline: Optional[str] = None,
+    tolerance: float = 0.1,
+):
+    params = {
+        "lang": lang.value,
+        "intents": intents,
+        "utterances": utterances,
+        "entities": entities,
+        "entity_values": entity_values,
+        "seed": seed,
+    }
+    with tempfile.TemporaryDirectory(prefix="avi-nlu-bench-") as workdir:
+        results = _run(_train, params, workdir)
+        loads = [_run(_load_and_parse, params, workdir, texts) for _ in range(runs)]
+    for name in loads[0]:
+        values = [load[name] for load in loads if load[name] is not None]
+        results[name] = statistics.median(values) if values else None
+
+    report = {
+        "environment": environment(),
+        "params": dict(params, texts=texts, runs=runs),
+        "results": results,
+    }
+    if output is not None:
+        with open(output, "w", encoding="utf8") as f:
+            json.dump(report, f, indent=2)
+
+    previous = {}
+    if baseline is not None:
+        with open(baseline, encoding="utf8") as f:
+            previous = json.load(f)
+        if previous["params"] != report["params"]:
+            typer.echo("warning: the baseline was run with other parameters", err=True)
+        previous = previous["results"]
+
+    typer.echo(f"{'measure':<16}{'unit':>6}{'current':>12}{'baseline':>12}")
+    for name, unit in MEASURES.items():
+        typer.echo(
+            f"{name:<16}{unit:>6}{_show(results.get(name), unit):>12}"
+            f"{_show(previous.get(name), unit):>12}"
+        )
+    typer.echo(f"{results['fallbacks']:.0f} of {texts} texts fell back to the AI")
+
+    regressions = compare(results, previous, tolerance)
+    if regressions:
+        typer.echo(f"regressions over {tolerance:.0%}: {', '.join(regressions)}")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
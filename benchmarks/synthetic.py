@@ -0,0 +1,139 @@
+"""
+Generates reproducible synthetic datasets to benchmark the engine with.
+
+    python -m benchmarks.synthetic --lang pt --intents 50 --output dataset.ndjson
+
+The output is NDJSON that can be sent to ``/intent_recognition/populate/stream``.
+Every intent has a few keywords of its own, mixed with filler words shared
+by all intents and with slots of custom entities. The same parameters and
+seed always give the same dataset.
+"""
+
+import json
+import random
+from typing import List, Optional, Union
+
+import typer
+
+from src.models import Entity, InputIntent, InputSlot, Lang
+
+SYLLABLES = {
+    Lang.EN: "ba be bi bo tra tre pro ple ste sto win wer ing ly ton kin mar".split(),
+    Lang.PT: "ba be ção ções lha lho nha ma mo rão são tu ti que gui ês ão".split(),
+}
+FILLERS = {
+    Lang.EN: "please the a to my for in on at with now can you could".split(),
+    Lang.PT: "por favor o a os as do da no na com agora podes pode".split(),
+}
+
+
+class SyntheticDataset:
+    """
+    ``intents`` intents of ``utterances`` utterances each, using up to two of
+    ``entities`` entities of ``entity_values`` values each.
+    """
+
+    def __init__(
+        self,
+        lang: Lang = Lang.EN,
+        intents: int = 20,
+        utterances: int = 20,
+        entities: int = 5,
+        entity_values: int = 50,
+        seed: int = 42,
+    ):
+        self.lang = Lang(lang)
+        self.utterances = utterances
+        self.random = random.Random(seed)
+        self.values = {
+            f"entity_{n}": self._values(entity_values) for n in range(entities)
+        }
+        self.keywords = {
+            f"intent_{n}": [self._word() for _ in range(3)] for n in range(intents)
+        }
+        self.slots = {
+            name: self.random.sample(sorted(self.values), min(2, entities))
+            for name in self.keywords
+        }
+
+    def items(self) -> List[Union[Entity, InputIntent]]:
+        """The entities and intents, as sent to the populate endpoint."""
+        entities = [
+            Entity(name=name, values=values, automatically_extensible=False)
+            for name, values in self.values.items()
+        ]
+        intents = [
+            InputIntent(
+                name=name,
+                utterances=[self._utterance(name) for _ in range(self.utterances)],
+                slots=[InputSlot(name=e, entity=e) for e in self.slots[name]],
+            )
+            for name in self.keywords
+        ]
+        return [*entities, *intents]
+
+    def dataset(self):
+        """The snips Dataset of the items."""
+        from src.ingest import DatasetBuilder
+
+        builder = DatasetBuilder(self.lang)
+        for item in self.items():
+            builder.add_item(item)
+        return builder.build()
+
+    def texts(self, count: int) -> List[str]:
+        """New utterances of random intents, without the slot annotations."""
+        names = sorted(self.keywords)
+        return [
+            self._utterance(self.random.choice(names), annotated=False)
+            for _ in range(count)
+        ]
+
+    def _utterance(self, intent: str, annotated: bool = True) -> str:
+        parts = self.random.sample(FILLERS[self.lang], 3) + self.keywords[intent]
+        parts += [e for e in self.slots[intent] if self.random.random() < 0.7]
+        self.random.shuffle(parts)
+
+        words = []
+        for part in parts:
+            if part in self.values:
+                value = self.random.choice(self.random.choice(self.values[part]))
+                words.append(f"[{part}]({value})" if annotated else value)
+            else:
+                words.append(part)
+        return " ".join(words)
+
+    def _values(self, count: int) -> List[List[str]]:
+        values = {}
+        while len(values) < count:
+            value = " ".join(self._word() for _ in range(self.random.randint(1, 3)))
+            synonyms = [self._word()] if self.random.random() < 0.2 else []
+            values.setdefault(value, [value, *synonyms])
+        return [values[value] for value in sorted(values)]
+
+    def _word(self) -> str:
+        return "".join(
+            self.random.choices(SYLLABLES[self.lang], k=self.random.randint(2, 3))
+        )
+
+
+def main(
+    lang: Lang = Lang.EN,
+    intents: int = 20,
+    utterances: int = 20,
+    entities: int = 5,
+    entity_values: int = 50,
+    seed: int = 42,
+    output: Optional[str] = None,
+):
+    dataset = SyntheticDataset(lang, intents, utterances, entities, entity_values, seed)
+    lines = [json.dumps(i.as_dict(), ensure_ascii=False) for i in dataset.items()]
+    if output is None:
+        typer.echo("\n".join(lines))
+    else:
+        with open(output, "w", encoding="utf8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    typer.run(main)
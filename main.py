@@ -1,8 +1,10 @@
+import multiprocessing
 import typer
 import os
 from src.models import Lang
 from src.config import __version__, engine_base_path
 from src.app import serve as api_serve, openapi as op
+from typing import List
 from typing_extensions import Annotated
 from src.ui import AVI_BANNER
 from click import clear
@@ -36,11 +38,78 @@ def serve(
         ),
     ] = 1178,
     verbose: bool = False,
+    workers: Annotated[
+        int,
+        typer.Option(
+            help="Worker processes, forked after loading the engine so that they share its memory. The dataset and engine can not be changed while they run: train with one worker, the workers load the trained engine when they start."
+        ),
+    ] = 1,
 ):
     """
     Starts a web api for AVI NLU
     """
-    api_serve(lang, host, port, verbose)
+    api_serve(lang, host, port, verbose, workers)
+
+
+@cli.command()
+def pack(lang: Lang = Lang.EN):
+    """
+    Convert a trained engine to the packed format, which loads faster
+    """
+    from src.kit import IntentKit
+
+    IntentKit(lang).pack()
+    typer.secho(f"Packed the {lang.value} engine", fg=typer.colors.GREEN)
+
+
+@cli.command()
+def memory(
+    lang: Annotated[
+        List[Lang], typer.Option(help="Language of an engine to load, can be repeated.")
+    ] = [Lang.EN],
+    json_output: Annotated[
+        bool, typer.Option("--json", help="Print the reports as JSON.")
+    ] = False,
+):
+    """
+    Load the trained engines and report the memory they take, by component
+    """
+    import json
+    import lingua_franca
+    from src.kit import IntentKit
+    from src.memory import report, rss, table
+
+    before = rss()
+    lingua_franca.load_languages(["en", "pt"])
+    after = rss()
+    lingua_franca_growth = after - before if before is not None else None
+
+    # The kits are kept, so each engine loads on top of the previous ones
+    kits = []
+    for code in lang:
+        kit = IntentKit(code)
+        if not os.path.exists(kit.engine_path):
+            typer.secho(
+                f"No trained {code.value} engine", fg=typer.colors.RED, err=True
+            )
+            raise typer.Exit(1)
+        kit.reuse()
+        kits.append(kit)
+    reports = [report(kit) for kit in kits]
+
+    if json_output:
+        typer.echo(
+            json.dumps(
+                {"lingua_franca_rss": lingua_franca_growth, "engines": reports},
+                indent=2,
+            )
+        )
+        return
+    if lingua_franca_growth is not None:
+        typer.echo(f"lingua_franca: +{lingua_franca_growth / 2**20:.1f} MiB RSS")
+    for r in reports:
+        typer.echo()
+        typer.echo(table(r))
 
 
 @cli.command()
@@ -78,6 +147,8 @@ def version(
 
 
 if __name__ == "__main__":
+    # Training workers are spawned, which frozen builds need to know about
+    multiprocessing.freeze_support()
     clear()
 
     typer.secho(AVI_BANNER, fg=typer.colors.CYAN, bold=True)
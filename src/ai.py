@@ -2,8 +2,16 @@ import os
 import json
 import requests
 
+from src.live_profiler import profiled
+from src.models import IntentError
+
+# The GEMINI_ENDPOINT environment variable can point to a local stand-in,
+# like the one of benchmarks.load_test
 GEMINI_ENDPOINT = "https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent"
 
+# Keeps the connections to the endpoint open between requests
+session = requests.Session()
+
 
 PROMPT = """# SYSTEM PROMPT — Avi Action Planner
 
@@ -429,6 +437,7 @@ Skills are **dynamically loaded** capabilities:
 """
 
 
+@profiled("generate")
 def generate(
     user_input: str,
     user_info=None,
@@ -436,8 +445,9 @@ def generate(
     core_functions=None,
     skills=None,
     model="gemini-1.5-flash",
-    api_key=os.environ.get("GEMINI_API_KEY"),
+    api_key=None,
 ):
+    api_key = api_key or os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY is not set")
 
@@ -463,34 +473,52 @@ def generate(
         },
     }
 
-    url = GEMINI_ENDPOINT.format(model=model)
-    params = {"key": api_key}
-
-    response = requests.post(
-        url,
-        params=params,
-        json=payload,
-        stream=True,
-        timeout=60,
-    )
-
-    response.raise_for_status()
-
-    text = ""
-
-    for line in response.iter_lines():
-        if not line:
-            continue
-
-        data = json.loads(line.decode("utf-8"))
-
-        candidates = data.get("candidates")
-        if not candidates:
-            continue
-
-        parts = candidates[0]["content"].get("parts", [])
-        for part in parts:
-            chunk = part.get("text", "")
-            text += chunk
-
-    return text
+    url = os.environ.get("GEMINI_ENDPOINT", GEMINI_ENDPOINT).format(model=model)
+    # Server-sent events, one JSON chunk per "data:" line
+    params = {"key": api_key, "alt": "sse"}
+
+    try:
+        response = session.post(
+            url,
+            params=params,
+            json=payload,
+            stream=True,
+            timeout=60,
+        )
+        response.raise_for_status()
+
+        text = ""
+
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+
+            data = json.loads(line[len(b"data:") :].decode("utf-8"))
+
+            candidates = data.get("candidates")
+            if not candidates:
+                continue
+
+            parts = candidates[0]["content"].get("parts", [])
+            for part in parts:
+                chunk = part.get("text", "")
+                text += chunk
+    except (requests.RequestException, ValueError) as e:
+        raise IntentError(f"Error getting the action plan: {e}")
+
+    return parse_plan(text)
+
+
+def parse_plan(text: str) -> dict:
+    """The action plan in the text of the model, which may be in a code block."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        plan = json.loads(text)
+    except ValueError:
+        raise IntentError(f"The action plan is not valid JSON: {text[:100]!r}")
+    if not isinstance(plan, dict) or not plan.get("actions"):
+        raise IntentError("The action plan has no actions")
+    return plan
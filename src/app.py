@@ -1,17 +1,106 @@
+import gc
+import json
+import logging
+import os
+import signal
 import time
 import lingua_franca
 from fastapi import Depends, FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from src import metrics, timing
+from src.features import token_features
 from src.kit import IntentKit
 from src.models import Alive, Lang, Route, AppError
-from src.config import __version__
+from src.config import __version__, api
+from src.profiler import Profiler, peak_rss, process_age
+from src.serialization import dumps
 from src.utils import get_kit
 from src.routes.intent_recognition import intent_router
 from src.routes.lang import lang_router
+from src.routes.admin import admin_router
 from scalar_fastapi import get_scalar_api_reference
 import typer
 import uvicorn
 
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with metrics.serialization_duration.time(), timing.stage("serialization"):
+            return dumps(content)
+
+
+class MetricsMiddleware:
+    """Records the time of every request, by the route that answered it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            metrics.errors.labels("INTERNAL_ERROR").inc()
+            raise
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.request_duration.labels(scope["method"], route).observe(
+                time.perf_counter() - start
+            )
+
+
+class ServerTimingMiddleware:
+    """
+    Records the time of the stages of every request, returns them in a
+    ``Server-Timing`` header and logs those of the requests slower than
+    ``api["TIMING_LOG_MS"]``. Both are checked on every request, which is
+    not timed when they are off.
+    """
+
+    logger = logging.getLogger("avi.timing")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (
+            not api["SERVER_TIMING"] and api["TIMING_LOG_MS"] is None
+        ):
+            return await self.app(scope, receive, send)
+        timings = timing.Timings()
+        token = timing.current.set(timings)
+        status = None
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if api["SERVER_TIMING"]:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"server-timing", timings.header().encode("latin-1")),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            timing.current.reset(token)
+            threshold = api["TIMING_LOG_MS"]
+            if threshold is not None and timings.total() * 1000 >= threshold:
+                route = getattr(scope.get("route"), "path", "unmatched")
+                record = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status,
+                    "timings_ms": timings.as_dict(),
+                }
+                self.logger.warning(json.dumps(record))
+
+
 app = FastAPI(
     title="Avi Server",
     version=__version__,
@@ -24,14 +113,50 @@ app = FastAPI(
     },
     docs_url=None,
     redoc_url=None,
+    default_response_class=TimedJSONResponse,
 )
 
 app.include_router(intent_router, prefix="/intent_recognition", tags=["intent"])
 app.include_router(lang_router, prefix="/lang", tags=["lang"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+
+
+def _cache_stats() -> dict:
+    stats = {("features",): token_features.stats()}
+    kit = getattr(app.state, "intentKit", None)
+    if kit is not None and kit.entity_cache is not None:
+        stats[("entities",)] = kit.entity_cache.stats()
+    return stats
+
+
+metrics.Collected(
+    "counter",
+    "avi_cache_hits",
+    "Lookups found in the token feature and builtin entity caches.",
+    ("cache",),
+    lambda: {cache: s["hits"] for cache, s in _cache_stats().items()},
+)
+metrics.Collected(
+    "counter",
+    "avi_cache_misses",
+    "Lookups missing from the token feature and builtin entity caches.",
+    ("cache",),
+    lambda: {cache: s["misses"] for cache, s in _cache_stats().items()},
+)
+
+
+@app.on_event("shutdown")
+async def save_caches():
+    kit = getattr(app.state, "intentKit", None)
+    if kit is not None:
+        kit.save_entity_cache()
 
 
 @app.exception_handler(AppError)
 async def app_error_handler(request: Request, exc: AppError):
+    metrics.errors.labels(exc.code).inc()
     return JSONResponse(
         status_code=exc.status_code,
         content={
@@ -60,6 +185,11 @@ async def scalar_html():
     )
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_text():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/", name="Route")
 async def route() -> Route:
     return Route(name="Avi")
@@ -82,65 +212,164 @@ def openapi(path: str):
         json.dump(openapi_schema, f, indent=2)
 
 
+def preload(lang: Lang) -> IntentKit:
+    """An IntentKit with the trained engine of ``lang`` loaded, when there is one."""
+    kit = IntentKit(lang)
+    if os.path.exists(kit.engine_path):
+        kit.reuse()
+    return kit
+
+
+class TracedServer(uvicorn.Server):
+    """
+    A server that times its startup, binding the socket included, and calls
+    ``on_ready`` once it accepts connections.
+    """
+
+    def __init__(self, config: uvicorn.Config, profiler: Profiler, on_ready=None):
+        super().__init__(config)
+        self.profiler = profiler
+        self.on_ready = on_ready
+
+    async def startup(self, sockets=None):
+        # Forked workers listen on the socket bound before forking
+        with self.profiler.stage("bind" if sockets is None else "listen"):
+            await super().startup(sockets=sockets)
+        if self.started and self.on_ready is not None:
+            self.on_ready()
+
+
+def imports_stage() -> dict:
+    """The time from the start of the process to now, mostly spent importing."""
+    return {
+        "name": "imports",
+        "stages": [],
+        "wall": process_age(),
+        "cpu": time.process_time(),
+        "peak_rss": peak_rss(),
+        "rss_growth": None,
+    }
+
+
+def serve_forked(config: uvicorn.Config, workers: int, profiler: Profiler, on_ready):
+    """
+    Runs the workers as forks of this process, so that they share the pages
+    of the engine, resources and entity parsers loaded before forking.
+    """
+    with profiler.stage("bind"):
+        sock = config.bind_socket()
+    app.state.master = os.getpid()
+    # Objects tracked by the gc would be copied by its first collection
+    gc.collect()
+    gc.freeze()
+    children = []
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # The first worker to start tells, the others start alike
+                ready = on_ready if worker == 0 else None
+                TracedServer(config, profiler, ready).run(sockets=[sock])
+            finally:
+                os._exit(0)
+        children.append(pid)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        for pid in children:
+            os.waitpid(pid, 0)
+        raise
+
+
 def serve(
-    lang: Lang = Lang.EN, host: str = "0.0.0.0", port: int = 1178, verbose: bool = False
+    lang: Lang = Lang.EN,
+    host: str = "0.0.0.0",
+    port: int = 1178,
+    verbose: bool = False,
+    workers: int = 1,
 ):
     """
     Start the AVI NLU server.
     """
-    import threading
-
+    forked = workers > 1 and hasattr(os, "fork")
+    profiler = Profiler("startup")
+    if process_age() is not None:
+        profiler.attach(imports_stage())
     try:
         steps = [
-            ("Initializing Environment", lambda: None),
+            ("environment", "Initializing Environment", lambda: None),
             (
+                "engine",
                 "Loading Intent Engine",
-                lambda: setattr(app.state, "intentKit", IntentKit(lang)),
+                lambda: setattr(app.state, "intentKit", preload(lang)),
             ),
             (
+                "lingua_franca",
                 f"Configuring Language: {lang.name}",
                 lambda: lingua_franca.load_languages(["en", "pt"]),
             ),
-            ("Initializing Runtime", lambda: None),
+            (
+                "warm_up",
+                "Initializing Runtime",
+                lambda: app.state.intentKit.warm_up(),
+            ),
         ]
 
-        for i, (step_name, step_func) in enumerate(steps, 1):
+        for i, (stage, step_name, step_func) in enumerate(steps, 1):
             with typer.progressbar(
                 length=1,
                 label=f"[{i}/{len(steps)}] {step_name}",
                 show_pos=False,
                 show_percent=False,
-            ) as bar:
+            ) as bar, profiler.stage(stage):
                 step_func()
                 bar.update(1)
 
         typer.echo()
 
         def print_server_ready():
-            import time
-
-            time.sleep(3)
+            trace = profiler.report()
+            imports = sum(s["wall"] for s in trace["stages"] if s["name"] == "imports")
+            trace["total"] = imports + trace["wall"]
             typer.echo()
             typer.secho(
                 f"Server started on http://{host}:{port}",
                 fg=typer.colors.BRIGHT_GREEN,
                 bold=True,
             )
+            typer.secho(
+                "Started in "
+                + ", ".join(f"{s['name']} {s['wall']:.2f}s" for s in trace["stages"])
+                + f", total {trace['total']:.2f}s",
+                fg=typer.colors.BRIGHT_BLACK,
+            )
+            if api["STARTUP_TRACE"] is not None:
+                os.makedirs(os.path.dirname(api["STARTUP_TRACE"]), exist_ok=True)
+                with open(api["STARTUP_TRACE"], "w") as f:
+                    json.dump(trace, f, indent=2)
+                if verbose:
+                    typer.secho(
+                        f"Startup trace: {api['STARTUP_TRACE']}",
+                        fg=typer.colors.BRIGHT_BLACK,
+                    )
             if not verbose:
                 typer.secho("Press Ctrl+C to stop", fg=typer.colors.BRIGHT_BLACK)
             typer.echo()
 
-        ready_thread = threading.Thread(target=print_server_ready, daemon=True)
-        ready_thread.start()
-
-        # Run uvicorn
-        uvicorn.run(
+        config = uvicorn.Config(
             app,
             host=host,
             port=port,
             log_level="info" if verbose else "error",
             access_log=verbose,
         )
+        if forked:
+            serve_forked(config, workers, profiler, print_server_ready)
+        else:
+            TracedServer(config, profiler, print_server_ready).run()
 
     except KeyboardInterrupt:
         typer.echo("\n")
@@ -0,0 +1,136 @@
+from typing import Dict, List
+
+import numpy as np
+from snips_nlu import SnipsNLUEngine
+from snips_nlu.exceptions import InvalidInputError, NotTrained
+from snips_nlu.intent_classifier import LogRegIntentClassifier
+from snips_nlu.intent_classifier.log_reg_classifier_utils import text_to_utterance
+from snips_nlu.intent_parser import ProbabilisticIntentParser
+from snips_nlu.result import (
+    empty_result,
+    intent_classification_result,
+    is_empty,
+    parsing_result,
+)
+from snips_nlu.slot_filler import CRFSlotFiller
+from src.viterbi import CRFTables, batch_slots
+
+
+def predict_proba(classifier: LogRegIntentClassifier, texts: List[str]) -> np.ndarray:
+    """
+    Probabilities of every intent of ``classifier.intent_list`` for each text,
+    featurized as one sparse matrix and scored with one product.
+    Texts must not be empty.
+    """
+    x = classifier.featurizer.transform([text_to_utterance(t) for t in texts])
+    model = classifier.classifier
+    scores = np.asarray(x @ np.asarray(model.coef_).T) + model.intercept_
+    # The classifier is one-vs-rest: each intent gets its own sigmoid
+    proba = 1.0 / (1.0 + np.exp(-scores))
+    if proba.shape[1] == 1:
+        return np.hstack([1 - proba, proba])
+    return proba
+
+
+def classify_batch(classifier: LogRegIntentClassifier, texts: List[str]) -> List[dict]:
+    """The same results as ``classifier.get_intent`` for each text."""
+    intent_list = classifier.intent_list
+    if not intent_list or not classifier.featurizer:
+        return [intent_classification_result(None, 1.0) for _ in texts]
+    if len(intent_list) == 1:
+        return [intent_classification_result(intent_list[0], 1.0) for _ in texts]
+
+    results = [intent_classification_result(None, 1.0) for _ in texts]
+    scored = [i for i, text in enumerate(texts) if text]
+    if scored:
+        proba = predict_proba(classifier, [texts[i] for i in scored])
+        # argmax keeps the first of ties, like the stable sort of get_intent
+        best = proba.argmax(axis=1)
+        for i, row, column in zip(scored, proba, best):
+            results[i] = intent_classification_result(
+                intent_list[column], float(row[column])
+            )
+    return results
+
+
+class BatchParser:
+    """
+    Parses many texts with the same results as ``engine.parse`` for each.
+    The intents are classified together, and the slots of the texts of an
+    intent are decoded together from CRF tables built here.
+    """
+
+    def __init__(self, engine: SnipsNLUEngine):
+        self.engine = engine
+        self.tables: Dict[str, CRFTables] = {}
+        for parser in engine.intent_parsers:
+            if isinstance(parser, ProbabilisticIntentParser):
+                for intent, slot_filler in parser.slot_fillers.items():
+                    if (
+                        isinstance(slot_filler, CRFSlotFiller)
+                        and slot_filler.crf_model is not None
+                    ):
+                        self.tables[intent] = CRFTables(slot_filler.crf_model)
+
+    def parse(self, texts: List[str]) -> List[dict]:
+        engine = self.engine
+        if not engine.fitted:
+            raise NotTrained("SnipsNLUEngine must be fitted")
+        for text in texts:
+            if not isinstance(text, str):
+                raise InvalidInputError(
+                    "Expected unicode but received: %s" % type(text)
+                )
+
+        results: List[dict] = [None] * len(texts)
+        none_proba = [0.0] * len(texts)
+        pending = list(range(len(texts)))
+        for parser in engine.intent_parsers:
+            if not pending:
+                break
+            if isinstance(parser, ProbabilisticIntentParser) and isinstance(
+                parser.intent_classifier, LogRegIntentClassifier
+            ):
+                parsed = self._parse_probabilistic(parser, [texts[i] for i in pending])
+            else:
+                parsed = [parser.parse(texts[i]) for i in pending]
+
+            remaining = []
+            for i, res in zip(pending, parsed):
+                if is_empty(res):
+                    none_proba[i] = res["intent"]["probability"]
+                    remaining.append(i)
+                else:
+                    slots = engine._resolve_slots(texts[i], res["slots"])
+                    results[i] = parsing_result(
+                        texts[i], intent=res["intent"], slots=slots
+                    )
+            pending = remaining
+
+        for i in pending:
+            results[i] = empty_result(texts[i], none_proba[i])
+        return results
+
+    def _parse_probabilistic(
+        self, parser: ProbabilisticIntentParser, texts: List[str]
+    ) -> List[dict]:
+        intents = classify_batch(parser.intent_classifier, texts)
+        by_intent: Dict[str, List[int]] = {}
+        for i, intent in enumerate(intents):
+            if intent["intentName"] is not None:
+                by_intent.setdefault(intent["intentName"], []).append(i)
+
+        slots: List[list] = [[] for _ in texts]
+        for name, indexes in by_intent.items():
+            slot_filler = parser.slot_fillers[name]
+            batch = [texts[i] for i in indexes]
+            if name in self.tables:
+                found = batch_slots(slot_filler, self.tables[name], batch)
+            else:
+                found = [slot_filler.get_slots(text) for text in batch]
+            for i, text_slots in zip(indexes, found):
+                slots[i] = text_slots
+        return [
+            parsing_result(text, intent, text_slots)
+            for text, intent, text_slots in zip(texts, intents, slots)
+        ]
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+def digest(*parts: Any) -> str:
+    """A stable key for json-like values."""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=_jsonable)
+    return hashlib.sha1(data.encode("utf8")).hexdigest()
+
+
+def state_digest(random_state) -> str:
+    """A key for the current state of a numpy RandomState."""
+    return hashlib.sha1(pickle.dumps(random_state.get_state())).hexdigest()
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    return repr(value)
+
+
+class TrainingCache:
+    """
+    On-disk cache of the preprocessing done while training.
+    Entries are evicted least recently used first once the cache grows
+    over ``max_bytes``. A limit of 0 disables the cache.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pending: Dict[str, bytes] = {}
+        self._used: Dict[str, float] = {}
+        self._digests: Dict[int, Tuple[Any, str]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        value = self._pending.get(key)
+        if value is None:
+            row = (
+                self._connect()
+                .execute("SELECT value FROM entries WHERE key = ?", (key,))
+                .fetchone()
+            )
+            value = row[0] if row else None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used[key] = time.time()
+        return pickle.loads(value)
+
+    def put(self, key: str, value: Any):
+        if self.enabled:
+            self._pending[key] = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def digest_of(self, value: Any) -> str:
+        """digest() of a large value, computed once per object."""
+        if id(value) not in self._digests:
+            # Keeps the value alive so that its id is not reused
+            self._digests[id(value)] = (value, digest(value))
+        return self._digests[id(value)][1]
+
+    def flush(self):
+        """Writes the new entries, then evicts the old ones over the limit."""
+        if not self.enabled or not (self._pending or self._used):
+            return
+        now = time.time()
+        db = self._connect()
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                [(k, v, len(v), now) for k, v in self._pending.items()],
+            )
+            db.executemany(
+                "UPDATE entries SET used = ? WHERE key = ?",
+                [(t, k) for k, t in self._used.items()],
+            )
+            self._evict(db)
+        self._pending.clear()
+        self._used.clear()
+
+    def clear(self):
+        if os.path.exists(self.path):
+            with self._connect() as db:
+                db.execute("DELETE FROM entries")
+        self._pending.clear()
+        self._used.clear()
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _evict(self, db: sqlite3.Connection):
+        (total,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        stale = []
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY used"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        db.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Training workers share the file, so wait for their writes
+            self._db = sqlite3.connect(self.path, timeout=60)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries(used)")
+        return self._db
+
+
+class CachedEntityParser:
+    """Serves the parses of an entity parser from the training cache."""
+
+    def __init__(self, parser, cache: TrainingCache, namespace: str):
+        self.parser = parser
+        self.cache = cache
+        self.namespace = namespace
+
+    def parse(self, text, scope=None, use_cache=True):
+        if not use_cache:
+            return self.parser.parse(text, scope, use_cache)
+        key = digest(self.namespace, text, sorted(scope) if scope is not None else None)
+        entities = self.cache.get(key)
+        if entities is None:
+            entities = self.parser.parse(text, scope, use_cache)
+            self.cache.put(key, entities)
+        return entities
+
+    def __getattr__(self, name):
+        return getattr(self.parser, name)
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from snips_nlu.exceptions import SnipsNLUError
+from starlette.concurrency import run_in_threadpool
+
+from src.config import inference
+from src.kit import IntentKit
+from src.metrics import errors
+from src.models import (
+    AppError,
+    EngineNotTrained,
+    IntentError,
+    Processor,
+    RecognitionRequest,
+)
+from src.partial import PartialSession
+from src.serialization import dumps
+
+
+class DeviceChannel:
+    """
+    Recognizes the texts a device sends on its WebSocket and pushes back the
+    results with their ids, as ``Recognized`` results without validating
+    them again. Failures are sent as ``{"id", "error": {"code", "message"}}``.
+
+    At most ``window`` texts are recognized at once; while they are, the
+    channel stops reading, so a device that sends faster than the engine
+    parses is slowed down by the connection instead of queued in memory.
+    With ``ordered``, the results are sent in the order of the requests,
+    otherwise as soon as each one is ready.
+
+    Requests with ``partial`` are partial transcripts of the utterance of
+    their id, answered with ``{"id", "partial", "stable", "result"}`` when
+    they change its parse, and the next request of the id without it is the
+    final transcript. See ``PartialSession``.
+    """
+
+    logger = logging.getLogger("avi.channel")
+
+    def __init__(
+        self, websocket: WebSocket, kit: IntentKit, ordered: bool, window: int
+    ):
+        self.websocket = websocket
+        self.kit = kit
+        self.ordered = ordered
+        self.window = asyncio.Semaphore(window)
+        self._send_lock = asyncio.Lock()
+        # Utterance id -> its session and the lock that keeps its parses in order
+        self.sessions: OrderedDict = OrderedDict()
+
+    async def run(self):
+        await self.websocket.accept()
+        tasks: Set[asyncio.Task] = set()
+        previous: Optional[asyncio.Task] = None
+        try:
+            while True:
+                await self.window.acquire()
+                try:
+                    message = await self.websocket.receive_text()
+                except WebSocketDisconnect:
+                    break
+                task = asyncio.ensure_future(
+                    self._answer(message, previous if self.ordered else None)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                previous = task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _answer(self, message: str, previous: Optional[asyncio.Task]):
+        try:
+            try:
+                reply = await self._recognize(message)
+            except Exception:
+                # Answered like the HTTP routes answer it, with a 500
+                self.logger.exception("Error recognizing a channel request")
+                reply = self._error(
+                    _id_of(message), "INTERNAL_ERROR", "Internal Server Error"
+                )
+            if previous is not None:
+                await asyncio.wait([previous])
+            if reply is not None:
+                await self._send(reply)
+        finally:
+            self.window.release()
+
+    async def _send(self, reply: dict):
+        try:
+            async with self._send_lock:
+                await self.websocket.send_text(dumps(reply).decode("utf-8"))
+        except (WebSocketDisconnect, RuntimeError):
+            # The device left, the results it waited for have no one to go to
+            pass
+
+    async def _recognize(self, message: str) -> Optional[dict]:
+        try:
+            request = RecognitionRequest.model_validate_json(message)
+        except ValidationError as e:
+            error = e.errors()[0]
+            where = ".".join(str(part) for part in error["loc"])
+            return self._error(
+                _id_of(message), "VALIDATION_ERROR", f"{where}: {error['msg']}"
+            )
+        try:
+            if request.partial or request.id in self.sessions:
+                return await self._transcript(request)
+            # In the threadpool, so that the requests of the window run together
+            data, processor = await run_in_threadpool(self.kit.parse, request.text)
+        except AttributeError:
+            return self._failed(request.id, EngineNotTrained())
+        except SnipsNLUError as e:
+            return self._failed(request.id, IntentError(str(e)))
+        except AppError as e:
+            return self._failed(request.id, e)
+        return {"id": request.id, "result": data, "processor": processor.value}
+
+    async def _transcript(self, request: RecognitionRequest) -> Optional[dict]:
+        if request.partial:
+            entry = self.sessions.get(request.id)
+            if entry is None:
+                entry = self.sessions[request.id] = (
+                    PartialSession(self.kit),
+                    asyncio.Lock(),
+                )
+                while len(self.sessions) > inference["PARTIAL_SESSIONS"]:
+                    self.sessions.popitem(last=False)
+        else:
+            entry = self.sessions.pop(request.id)
+        session, lock = entry
+
+        async with lock:
+            if not request.partial:
+                data, processor = await run_in_threadpool(session.final, request.text)
+                return {"id": request.id, "result": data, "processor": processor.value}
+            parsed = await run_in_threadpool(session.partial, request.text)
+            if parsed is None:
+                return None
+            return {
+                "id": request.id,
+                "partial": True,
+                "stable": session.stable,
+                "result": parsed,
+                "processor": Processor.ENGINE.value,
+            }
+
+    def _failed(self, id: str, error: AppError) -> dict:
+        return self._error(id, error.code, error.message)
+
+    @staticmethod
+    def _error(id: Optional[str], code: str, message: str) -> dict:
+        errors.labels(code).inc()
+        return {"id": id, "error": {"code": code, "message": message}}
+
+
+def _id_of(message: str) -> Optional[str]:
+    """The id of an invalid request, when it has one to answer to."""
+    try:
+        id = json.loads(message).get("id")
+    except (ValueError, AttributeError):
+        return None
+    return id if isinstance(id, str) else None
@@ -1,5 +1,47 @@
+import os
+
 import typer
 
 __version__ = "1.9.2"
 engine_base_path = f"{typer.get_app_dir('avi-nlu')}/engine/"
-api = {"HOST": "0.0.0.0", "PORT": 1178}
+api = {
+    "HOST": "0.0.0.0",
+    "PORT": 1178,
+    # Returns the time of the stages of every request in a Server-Timing header
+    "SERVER_TIMING": os.environ.get("AVI_SERVER_TIMING") == "1",
+    # Logs the stages of the requests slower than this many ms, None to disable
+    "TIMING_LOG_MS": (
+        float(os.environ["AVI_TIMING_LOG_MS"])
+        if os.environ.get("AVI_TIMING_LOG_MS")
+        else None
+    ),
+    # Bearer token of the /admin endpoints, which are disabled without one
+    "ADMIN_TOKEN": os.environ.get("AVI_ADMIN_TOKEN"),
+    # Validates the results against the response models, to debug them
+    "VALIDATE_RESPONSES": os.environ.get("AVI_VALIDATE_RESPONSES") == "1",
+    # Where serve() writes the time of its startup stages, None to disable
+    "STARTUP_TRACE": f"{typer.get_app_dir('avi-nlu')}/startup_trace.json",
+}
+inference = {
+    "TOKEN_CACHE_SIZE": 50_000,
+    "BUILTIN_CACHE_SIZE": 10_000,
+    # Most used builtin entity parses kept across restarts, 0 to disable
+    "BUILTIN_CACHE_WARM_START": 1_000,
+    "BUILTIN_CACHE_PATH": f"{typer.get_app_dir('avi-nlu')}/cache/builtin_entities",
+    # Parses of partial transcripts in a row with the same intent to call it stable
+    "PARTIAL_STABLE_PARSES": 2,
+    # Utterances a device channel keeps partial transcripts of at once
+    "PARTIAL_SESSIONS": 16,
+}
+training = {
+    "WORKERS": 1,
+    "SEED": 42,
+    "CACHE_PATH": f"{typer.get_app_dir('avi-nlu')}/cache/training.sqlite",
+    "CACHE_SIZE": 256 * 1024 * 1024,
+    "PACK": False,
+    # Fit one engine per intent name prefix, and a router between them
+    "HIERARCHICAL": False,
+    "DOMAIN_SEPARATOR": ".",
+    # Entities with at least this many values are matched on a sorted index
+    "LARGE_ENTITY_SIZE": 10_000,
+}
@@ -0,0 +1,260 @@
+import json
+import multiprocessing
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from snips_nlu import SnipsNLUEngine
+from snips_nlu.dataset import Dataset
+from snips_nlu.default_configs import CONFIG_EN, CONFIG_PT_PT
+from snips_nlu.intent_parser import ProbabilisticIntentParser
+from snips_nlu.result import empty_result
+from src.batch import BatchParser
+from src.config import training
+from src.engines import HIERARCHY_FILE
+from src.profiler import Profiler
+from src.resources import load_engine
+from src.training import fit_engine, unit_seed
+
+DEFAULT_DOMAIN = "default"
+ROUTER = "router"
+
+
+def domain_of(intent: str, separator: Optional[str] = None) -> str:
+    """The name prefix of an intent, like ``light`` for ``light.turn_on``."""
+    separator = training["DOMAIN_SEPARATOR"] if separator is None else separator
+    if separator in intent:
+        return intent.split(separator, 1)[0]
+    return DEFAULT_DOMAIN
+
+
+def split_dataset(dataset: dict) -> Dict[str, dict]:
+    """The dataset of every domain, with the entities its intents use."""
+    domains: Dict[str, dict] = {}
+    for name, intent in dataset["intents"].items():
+        domain = domains.setdefault(
+            domain_of(name),
+            {"language": dataset["language"], "intents": {}, "entities": {}},
+        )
+        domain["intents"][name] = intent
+        for utterance in intent["utterances"]:
+            for chunk in utterance["data"]:
+                if "entity" in chunk:
+                    domain["entities"][chunk["entity"]] = dataset["entities"][
+                        chunk["entity"]
+                    ]
+    return domains
+
+
+def router_dataset(dataset: dict) -> dict:
+    """
+    One intent per domain with the utterances of all its intents. The slots
+    are kept as plain text, so that the router fits no slot filler, but the
+    entities stay for the classifier to match their values.
+    """
+    intents: Dict[str, dict] = {}
+    for name, intent in dataset["intents"].items():
+        utterances = intents.setdefault(domain_of(name), {"utterances": []})
+        for utterance in intent["utterances"]:
+            text = "".join(chunk["text"] for chunk in utterance["data"])
+            utterances["utterances"].append({"data": [{"text": text}]})
+    return {
+        "language": dataset["language"],
+        "intents": intents,
+        "entities": dataset["entities"],
+    }
+
+
+def engine_config(lang: str) -> dict:
+    return CONFIG_EN if lang == "en" else CONFIG_PT_PT
+
+
+def router_config(lang: str) -> dict:
+    """The engine config without the parsers that only match whole utterances."""
+    config = deepcopy(engine_config(lang))
+    config["intent_parsers_configs"] = [
+        parser
+        for parser in config["intent_parsers_configs"]
+        if parser["unit_name"] == ProbabilisticIntentParser.unit_name
+    ]
+    return config
+
+
+class DomainEngine:
+    """
+    A router that picks the domain of a text, and one engine per domain
+    that parses the texts routed to it.
+    """
+
+    def __init__(self, router: SnipsNLUEngine, engines: Dict[str, SnipsNLUEngine]):
+        self.router = router
+        self.engines = engines
+
+    @property
+    def fitted(self) -> bool:
+        return self.router.fitted and all(e.fitted for e in self.engines.values())
+
+    @property
+    def builtin_entity_parser(self):
+        return self.router.builtin_entity_parser
+
+    @property
+    def dataset_metadata(self) -> dict:
+        metadata = {
+            "language_code": self.router.dataset_metadata["language_code"],
+            "entities": {},
+            "slot_name_mappings": {},
+        }
+        for engine in self.engines.values():
+            metadata["entities"].update(engine.dataset_metadata["entities"])
+            metadata["slot_name_mappings"].update(
+                engine.dataset_metadata["slot_name_mappings"]
+            )
+        return metadata
+
+    def all_engines(self) -> List[SnipsNLUEngine]:
+        return [self.router, *self.engines.values()]
+
+    def parse(self, text: str) -> dict:
+        routed = self.router.parse(text)
+        engine = self.engines.get(routed["intent"]["intentName"])
+        if engine is None:
+            return empty_result(text, routed["intent"]["probability"])
+        return engine.parse(text)
+
+    @classmethod
+    def from_path(cls, path: str) -> "DomainEngine":
+        with open(f"{path}/{HIERARCHY_FILE}", encoding="utf8") as f:
+            hierarchy = json.load(f)
+        return cls(
+            load_engine(f"{path}/{hierarchy['router']}"),
+            {
+                domain: load_engine(f"{path}/{directory}")
+                for domain, directory in hierarchy["domains"].items()
+            },
+        )
+
+
+class DomainBatchParser:
+    """
+    BatchParser of a DomainEngine. The texts are routed together, then the
+    texts of each domain are parsed together.
+    """
+
+    def __init__(self, engine: DomainEngine):
+        self.engine = engine
+        self.router = BatchParser(engine.router)
+        self.parsers = {d: BatchParser(e) for d, e in engine.engines.items()}
+
+    def parse(self, texts: List[str]) -> List[dict]:
+        results: List[dict] = [None] * len(texts)
+        by_domain: Dict[str, List[int]] = {}
+        for i, routed in enumerate(self.router.parse(texts)):
+            domain = routed["intent"]["intentName"]
+            if domain in self.parsers:
+                by_domain.setdefault(domain, []).append(i)
+            else:
+                results[i] = empty_result(texts[i], routed["intent"]["probability"])
+        for domain, indexes in by_domain.items():
+            parsed = self.parsers[domain].parse([texts[i] for i in indexes])
+            for i, result in zip(indexes, parsed):
+                results[i] = result
+        return results
+
+
+def fit_domains(
+    data: Dataset,
+    path: str,
+    previous: Optional[str] = None,
+    intents: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    profiler: Optional[Profiler] = None,
+) -> DomainEngine:
+    """
+    Fits the router and the engine of every domain, persisting them at ``path``.
+
+    When ``intents`` is given, only the engines of their domains are fitted
+    and the others are copied from the engine persisted at ``previous``.
+    The router depends on every utterance and is always refitted.
+    With more than one worker the engines of the domains are fitted in
+    parallel, while the router is fitted here. ``workers`` and ``seed``
+    default to the training config at the time of the call.
+    """
+    workers = training["WORKERS"] if workers is None else workers
+    seed = training["SEED"] if seed is None else seed
+    profiler = profiler or Profiler("train")
+    dataset = data.json
+    domains = split_dataset(dataset)
+    directories = {domain: f"domain_{n}" for n, domain in enumerate(sorted(domains))}
+    root = Path(path)
+    root.mkdir(parents=True)
+
+    previous_domains: Dict[str, str] = {}
+    if previous is not None and intents is not None:
+        with open(f"{previous}/{HIERARCHY_FILE}", encoding="utf8") as f:
+            previous_domains = json.load(f)["domains"]
+    retrain = set(domains) - set(previous_domains)
+    retrain |= {domain_of(i) for i in intents or ()} & set(domains)
+
+    engines: Dict[str, SnipsNLUEngine] = {}
+    for domain in sorted(set(domains) - retrain):
+        with profiler.stage(domain):
+            shutil.copytree(
+                f"{previous}/{previous_domains[domain]}", root / directories[domain]
+            )
+            engines[domain] = load_engine(root / directories[domain])
+
+    jobs = [
+        (dataset["language"], domains[d], unit_seed(seed, d), root / directories[d])
+        for d in sorted(retrain)
+    ]
+    with profiler.stage("domains"):
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(jobs)),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+                futures = [pool.submit(_fit_domain_in_worker, *job) for job in jobs]
+                router = _fit_router(dataset, root / ROUTER, seed, profiler)
+                for domain, future in zip(sorted(retrain), futures):
+                    profiler.attach(future.result())
+                    engines[domain] = load_engine(root / directories[domain])
+        else:
+            for domain, job in zip(sorted(retrain), jobs):
+                engines[domain], profile = _fit_domain(*job)
+                profiler.attach(profile)
+            router = _fit_router(dataset, root / ROUTER, seed, profiler)
+
+    with open(root / HIERARCHY_FILE, "w", encoding="utf8") as f:
+        json.dump({"router": ROUTER, "domains": directories}, f)
+    return DomainEngine(router, engines)
+
+
+def _fit_router(dataset: dict, path: Path, seed: int, profiler: Profiler):
+    with profiler.stage(ROUTER):
+        seed = unit_seed(seed, ROUTER)
+        router = SnipsNLUEngine(
+            config=router_config(dataset["language"]), random_state=seed
+        )
+        fit_engine(
+            router, router_dataset(dataset), workers=1, seed=seed, profiler=profiler
+        )
+        router.persist(path)
+    return router
+
+
+def _fit_domain(
+    lang: str, dataset: dict, seed: int, path: Path
+) -> Tuple[SnipsNLUEngine, dict]:
+    profiler = Profiler(path.name)
+    engine = SnipsNLUEngine(config=engine_config(lang), random_state=seed)
+    fit_engine(engine, dataset, workers=1, seed=seed, profiler=profiler)
+    engine.persist(path)
+    return engine, profiler.report()
+
+
+def _fit_domain_in_worker(lang: str, dataset: dict, seed: int, path: Path) -> dict:
+    return _fit_domain(lang, dataset, seed, path)[1]
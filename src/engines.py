@@ -0,0 +1,101 @@
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+from src.config import __version__, engine_base_path
+
+METADATA_FILE = "dataset_metadata.json"
+# Written instead of nlu_engine.json by engines split in domains
+HIERARCHY_FILE = "hierarchy.json"
+
+
+def write_metadata(engine_path: str, dataset_metadata: Optional[dict]):
+    """Writes the sidecar that /installed reads instead of nlu_engine.json."""
+    with open(f"{engine_path}/{METADATA_FILE}", "w", encoding="utf8") as f:
+        json.dump({"version": __version__, "dataset_metadata": dataset_metadata}, f)
+
+
+def read_metadata(engine_path: str) -> Optional[dict]:
+    """
+    Reads the sidecar of an engine. Engines persisted before it existed, or
+    by another version, get it written from nlu_engine.json first.
+    """
+    sidecar = f"{engine_path}/{METADATA_FILE}"
+    if os.path.exists(sidecar):
+        with open(sidecar, encoding="utf8") as f:
+            metadata = json.load(f)
+        if metadata.get("version") == __version__:
+            return metadata["dataset_metadata"]
+
+    if os.path.exists(f"{engine_path}/{HIERARCHY_FILE}"):
+        dataset_metadata = _hierarchy_metadata(engine_path)
+    else:
+        dataset_metadata = _engine_metadata(engine_path)
+    write_metadata(engine_path, dataset_metadata)
+    return dataset_metadata
+
+
+def _engine_metadata(engine_path: str) -> Optional[dict]:
+    with open(f"{engine_path}/nlu_engine.json", encoding="utf8") as f:
+        return json.load(f)["dataset_metadata"]
+
+
+def _hierarchy_metadata(engine_path: str) -> Optional[dict]:
+    """The metadata of the domain engines merged, as DomainEngine has it."""
+    with open(f"{engine_path}/{HIERARCHY_FILE}", encoding="utf8") as f:
+        hierarchy = json.load(f)
+    router = _engine_metadata(f"{engine_path}/{hierarchy['router']}")
+    if router is None:
+        return None
+    metadata = {
+        "language_code": router["language_code"],
+        "entities": {},
+        "slot_name_mappings": {},
+    }
+    for directory in hierarchy["domains"].values():
+        domain = _engine_metadata(f"{engine_path}/{directory}") or {}
+        metadata["entities"].update(domain.get("entities", {}))
+        metadata["slot_name_mappings"].update(domain.get("slot_name_mappings", {}))
+    return metadata
+
+
+class EngineIndex:
+    """
+    Dataset metadata of the installed engines, kept in memory.
+    An engine is read again only when its directory changes, which
+    retraining always does since it replaces the directory.
+    """
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self._engines: Dict[str, Tuple[Tuple[int, int], Optional[dict]]] = {}
+
+    def installed(self) -> Dict[str, Optional[dict]]:
+        engines = {}
+        for lang in sorted(os.listdir(self.base_path)):
+            path = f"{self.base_path}/{lang}"
+            # Engines train() is still persisting
+            if lang.endswith(".new"):
+                continue
+            if not (
+                os.path.exists(f"{path}/nlu_engine.json")
+                or os.path.exists(f"{path}/{HIERARCHY_FILE}")
+            ):
+                continue
+            cached = self._engines.get(lang)
+            if cached is None or cached[0] != _stamp(path):
+                metadata = read_metadata(path)
+                # Stamped after reading, as writing a missing sidecar touches it
+                cached = self._engines[lang] = (_stamp(path), metadata)
+            engines[lang] = cached[1]
+        for lang in set(self._engines) - set(engines):
+            del self._engines[lang]
+        return engines
+
+
+def _stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+installed_engines = EngineIndex(engine_base_path)
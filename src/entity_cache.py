@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import Hashable, Optional
+
+from src.config import __version__, inference
+
+
+class EntityParseCache(OrderedDict):
+    """
+    LRU for the ``_cache`` of a snips entity parser, which only keeps the
+    latest parses, that also counts its hits and misses.
+
+    Parses run in many threads. ``EntityParser.parse`` checks that a key is
+    cached, or caches it, then reads it; the entry is remembered for the
+    thread at the check, so that an eviction by another thread in between
+    does not make the read fail.
+    """
+
+    def __init__(self, size_limit: int):
+        super().__init__()
+        self.size_limit = size_limit
+        self.hits = 0
+        self.misses = 0
+        self.uses: Counter = Counter()
+        self._lock = threading.RLock()
+        self._last = threading.local()
+
+    def __contains__(self, key: Hashable) -> bool:
+        # EntityParser.parse checks membership once per parse
+        with self._lock:
+            found = super().__contains__(key)
+            if found:
+                self.hits += 1
+                self.uses[key] += 1
+                self.move_to_end(key)
+                self._last.entry = (key, super().__getitem__(key))
+            else:
+                self.misses += 1
+            return found
+
+    def __getitem__(self, key: Hashable):
+        with self._lock:
+            if super().__contains__(key):
+                return super().__getitem__(key)
+        last = getattr(self._last, "entry", None)
+        if last is not None and last[0] == key:
+            return last[1]
+        raise KeyError(key)
+
+    def __setitem__(self, key: Hashable, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self._last.entry = (key, value)
+            while len(self) > self.size_limit:
+                evicted, _ = self.popitem(last=False)
+                self.uses.pop(evicted, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self),
+                "max_entries": self.size_limit,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def save(self, path: str, count: int):
+        """Writes the ``count`` most used entries."""
+        with self._lock:
+            hottest = sorted(self, key=lambda k: self.uses[k], reverse=True)[:count]
+            entries = [
+                {
+                    "text": key[0],
+                    "scope": key[1],
+                    "entities": OrderedDict.__getitem__(self, key),
+                    "uses": self.uses[key],
+                }
+                for key in hottest
+            ]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Forked workers save the same file
+        staging = f"{path}.{os.getpid()}"
+        with open(staging, "w", encoding="utf8") as f:
+            json.dump(
+                {"version": __version__, "entries": entries}, f, ensure_ascii=False
+            )
+        os.replace(staging, path)
+
+    def restore(self, path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf8") as f:
+            saved = json.load(f)
+        if saved.get("version") != __version__:
+            return
+        # The least used first, so that they are the first evicted
+        with self._lock:
+            for entry in reversed(saved["entries"]):
+                scope = tuple(entry["scope"]) if entry["scope"] is not None else None
+                key = (entry["text"], scope)
+                self[key] = entry["entities"]
+                self.uses[key] = entry["uses"]
+
+
+def builtin_entity_cache(
+    engine, shared: Optional[EntityParseCache] = None
+) -> Optional[EntityParseCache]:
+    """
+    Replaces the parse cache of the builtin entity parser of an engine by
+    ``shared``, or a new one, keeping what it holds. A parser shared by
+    engines keeps its cache.
+    """
+    parser = engine.builtin_entity_parser
+    if parser is None:
+        return shared
+    if parser._cache is not shared and (
+        shared is not None or not isinstance(parser._cache, EntityParseCache)
+    ):
+        cache = shared or EntityParseCache(inference["BUILTIN_CACHE_SIZE"])
+        for key, value in list(parser._cache.items()):
+            cache[key] = value
+        parser._cache = cache
+    return parser._cache
+
+
+def warm_start_path(lang: str) -> str:
+    return f"{inference['BUILTIN_CACHE_PATH']}/{lang}.json"
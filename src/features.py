@@ -0,0 +1,149 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from snips_nlu.common.dict_utils import UnupdatableDict
+from snips_nlu.slot_filler import CRFSlotFiller
+from snips_nlu.slot_filler.feature import TOKEN_NAME
+from snips_nlu.slot_filler.feature_factory import (
+    IsDigitFactory,
+    LengthFactory,
+    NgramFactory,
+    PrefixFactory,
+    ShapeNgramFactory,
+    SuffixFactory,
+    WordClusterFactory,
+)
+from src.config import inference
+
+# Factories whose value for a token does not depend on the other tokens
+_LOCAL_FACTORIES = (
+    IsDigitFactory,
+    LengthFactory,
+    PrefixFactory,
+    SuffixFactory,
+    WordClusterFactory,
+)
+
+
+class TokenFeatureCache:
+    """
+    Process-wide LRU of the CRF features that only depend on a token,
+    keyed by language and token.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        # (language, token) -> (features, size in bytes)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, language: str, token: str) -> Optional[Dict[str, Optional[str]]]:
+        key = (language, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, language: str, token: str, features: Dict[str, Optional[str]]):
+        if self.max_entries <= 0:
+            return
+        key = (language, token)
+        size = _size(key, features)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (features, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def invalidate(self, language: str):
+        """Drops the tokens of a language, as its engine was replaced."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == language]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _size(key: Tuple[str, str], features: Dict[str, Optional[str]]) -> int:
+    return (
+        sys.getsizeof(key)
+        + sys.getsizeof(key[1])
+        + sys.getsizeof(features)
+        + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in features.items())
+    )
+
+
+token_features = TokenFeatureCache(inference["TOKEN_CACHE_SIZE"])
+
+
+class CachedFeatures:
+    """
+    ``compute_features`` of a CRF slot filler that starts from the cached
+    features of each token instead of computing them again.
+    """
+
+    def __init__(self, slot_filler: CRFSlotFiller, cache: TokenFeatureCache):
+        self.slot_filler = slot_filler
+        self.cache = cache
+        self.local: Set[str] = {
+            feature.base_name
+            for factory in slot_filler.features_factories
+            if isinstance(factory, _LOCAL_FACTORIES)
+            or (
+                isinstance(factory, (NgramFactory, ShapeNgramFactory))
+                and factory.n == 1
+            )
+            for feature in factory.build_features()
+        }
+
+    def __call__(self, tokens, drop_out=False):
+        if drop_out:
+            return CRFSlotFiller.compute_features(self.slot_filler, tokens, drop_out)
+
+        language = self.slot_filler.language
+        known = [self.cache.get(language, token.value) or {} for token in tokens]
+        cache = [{TOKEN_NAME: token, **values} for token, values in zip(tokens, known)]
+        features = []
+        for i in range(len(tokens)):
+            token_features = UnupdatableDict()
+            for feature in self.slot_filler.features:
+                value = feature.compute(i, cache)
+                if value is not None:
+                    token_features[feature.name] = value
+            features.append(token_features)
+
+        for token, values, computed in zip(tokens, known, cache):
+            local = {name: computed[name] for name in self.local if name in computed}
+            if len(local) > len(values):
+                self.cache.put(language, token.value, local)
+        return features
+
+
+def share_token_features(engine, cache: TokenFeatureCache = token_features):
+    """Makes the CRF slot fillers of an engine use the token feature cache."""
+    for parser in engine.intent_parsers:
+        for slot_filler in getattr(parser, "slot_fillers", {}).values():
+            if isinstance(slot_filler, CRFSlotFiller):
+                slot_filler.compute_features = CachedFeatures(slot_filler, cache)
@@ -0,0 +1,125 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, List
+
+from pydantic import TypeAdapter, ValidationError
+from snips_nlu.dataset import Dataset, Intent
+from snips_nlu.dataset.entity import Entity
+from snips_nlu.dataset.yaml_wrapper import yaml
+
+from src.models import (
+    Lang,
+    PopulateProgress,
+    TrainingItem,
+    UnsupportedMediaType,
+    WrongDataset,
+)
+
+NDJSON = "application/x-ndjson"
+YAML = "application/x-yaml"
+MEDIA_TYPES = {
+    NDJSON: NDJSON,
+    "application/jsonl": NDJSON,
+    "application/json-seq": NDJSON,
+    YAML: YAML,
+    "application/yaml": YAML,
+    "text/yaml": YAML,
+}
+
+training_item = TypeAdapter(TrainingItem)
+
+
+class DatasetBuilder:
+    """Builds a snips Dataset one intent or entity at a time."""
+
+    def __init__(self, language: Lang):
+        self.language = language
+        self.intents: List[Intent] = []
+        self.entities: List[Entity] = []
+        self.progress = PopulateProgress(language=language)
+
+    def add(self, document: Any):
+        """Validates a raw document and converts it right away."""
+        self.progress.records += 1
+        try:
+            item = training_item.validate_python(document)
+        except ValidationError as e:
+            raise WrongDataset(f"Invalid document {self.progress.records}: {e}")
+        self.add_item(item)
+
+    def add_item(self, item: TrainingItem):
+        """Converts an already validated intent or entity."""
+        if item.type == "entity":
+            self.entities.append(Entity.from_yaml(item.as_dict()))
+            self.progress.entities += 1
+        else:
+            self.intents.append(Intent.from_yaml(item.as_dict()))
+            self.progress.intents += 1
+
+    async def consume(self, chunks: AsyncIterator[bytes], media_type: str):
+        """Reads a NDJSON or multi-document YAML body as it arrives."""
+        kind = MEDIA_TYPES.get(media_type)
+        if kind is None:
+            raise UnsupportedMediaType(media_type)
+
+        documents = _ndjson if kind == NDJSON else _yaml
+        async for document in documents(self._count(chunks)):
+            self.add(document)
+
+    def build(self) -> Dataset:
+        if not self.intents:
+            raise WrongDataset("The dataset must contain at least one intent")
+        dataset = Dataset(self.language, self.intents, self.entities)
+        self.progress.state = "done"
+        return dataset
+
+    async def _count(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            self.progress.bytes += len(chunk)
+            yield chunk
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise WrongDataset(f"Invalid JSON line: {e}")
+
+
+async def _yaml(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    document: List[str] = []
+    async for line in _lines(chunks):
+        if line.startswith("---") or line.startswith("..."):
+            if document:
+                parsed = _load_yaml(document)
+                if parsed is not None:
+                    yield parsed
+            document = [line[3:]] if line.startswith("---") else []
+        else:
+            document.append(line)
+    parsed = _load_yaml(document)
+    if parsed is not None:
+        yield parsed
+
+
+def _load_yaml(lines: List[str]) -> Any:
+    try:
+        return yaml.safe_load("\n".join(lines))
+    except yaml.YAMLError as e:
+        raise WrongDataset(f"Invalid YAML document: {e}")
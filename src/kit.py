@@ -1,61 +1,308 @@
+import json
 import os
+import shutil
+import threading
+from typing import Iterable, List, Set, Tuple
 from typing_extensions import Optional
 
 from snips_nlu import SnipsNLUEngine
-from snips_nlu.dataset import Dataset
+from snips_nlu.dataset import Dataset, Entity, Intent
 from snips_nlu.default_configs import CONFIG_EN, CONFIG_PT_PT
-from src.models import Lang, Processor
-from src.config import engine_base_path
+from src.models import Lang, PopulateProgress, Processor
+from src.config import engine_base_path, inference, training
 from src.ai import generate
+from src.batch import BatchParser
+from src.domains import DomainBatchParser, DomainEngine, fit_domains
+from src.engines import HIERARCHY_FILE, write_metadata
+from src.entity_cache import EntityParseCache, builtin_entity_cache, warm_start_path
+from src.features import share_token_features, token_features
+from src.live_profiler import profiled
+from src.lookup import LOOKUP_FILE, TemplateIndex
+from src.memory import rss
+from src.metrics import fallback_duration, lookups, parse_duration, recognitions
+from src.packed import PACKED_DIR, pack_engine
+from src.profiler import Profiler
+from src.resources import load_engine
+from src.timing import stage, timed_stage
+from src.training import fit_engine
+
+PROFILE_FILE = "training_profile.json"
 
 
 class IntentKit:
     engine = None
     loaded = False
     data: Optional[Dataset] = None
+    ingest: Optional[PopulateProgress] = None
+    profile: Optional[dict] = None
+    lookup: Optional[TemplateIndex] = None
+    batch: Optional[BatchParser] = None
+    entity_cache: Optional[EntityParseCache] = None
+    # RSS of the process before and after the engine was loaded by reuse()
+    load_rss: Optional[Tuple[int, int]] = None
     lang: Lang = Lang.EN
     engine_path: str
 
     def __init__(self, lang: Lang = Lang.EN) -> None:
         self.lang = lang
         self.engine_path = f"{engine_base_path}/{lang}"
+        # Serializes train, patch and reuse, parses go on beside them
+        self._lock = threading.RLock()
 
     def populate(self, data: Dataset):
         self.data = data
 
     def reuse(self):
-        if os.path.exists(self.engine_path):
-            self.engine = SnipsNLUEngine.from_path(self.engine_path)
-            self.loaded = True
-        elif not os.path.exists(self.engine_path):
-            self.train()
+        with self._lock:
+            if not os.path.exists(self.engine_path):
+                return self.train()
+            before = rss()
+            if os.path.exists(f"{self.engine_path}/{HIERARCHY_FILE}"):
+                engine = DomainEngine.from_path(self.engine_path)
+            else:
+                engine = load_engine(self.engine_path)
+            # The index of the loaded engine, the populated data may be newer
+            lookup = None
+            if os.path.exists(f"{self.engine_path}/{LOOKUP_FILE}"):
+                lookup = TemplateIndex.from_path(f"{self.engine_path}/{LOOKUP_FILE}")
+            self._swap(engine, lookup)
+            self.load_rss = (before, rss())
+            self.profile = None
+            if os.path.exists(f"{self.engine_path}/{PROFILE_FILE}"):
+                with open(f"{self.engine_path}/{PROFILE_FILE}") as f:
+                    self.profile = json.load(f)
 
-    def train(self):
-        if self.engine is not None:
-            del self.engine
+    def patch(
+        self,
+        intents: List[Intent],
+        entities: List[Entity],
+        removed_intents: Iterable[str] = (),
+        removed_entities: Iterable[str] = (),
+    ) -> Set[str]:
+        """
+        Applies a diff on the populated dataset.
+        Returns the intents whose slot fillers are affected by it.
+        """
+        with self._lock:
+            return self._patch(intents, entities, removed_intents, removed_entities)
 
+    def _patch(
+        self,
+        intents: List[Intent],
+        entities: List[Entity],
+        removed_intents: Iterable[str],
+        removed_entities: Iterable[str],
+    ) -> Set[str]:
         if self.data is None:
             raise Exception("Please populate the data first")
 
-        self.engine = SnipsNLUEngine(
-            config=CONFIG_EN if self.lang == "en" else CONFIG_PT_PT
+        removed_entities = set(removed_entities)
+        changed_entities = removed_entities | {e.name for e in entities}
+        touched = set(removed_intents) | {i.intent_name for i in intents}
+
+        current_intents = {i.intent_name: i for i in self.data.intents}
+        current_entities = {e.name: e for e in self.data.entities}
+        for name in touched:
+            current_intents.pop(name, None)
+        for name in removed_entities:
+            current_entities.pop(name, None)
+        current_intents.update({i.intent_name: i for i in intents})
+        current_entities.update({e.name: e for e in entities})
+
+        touched |= {
+            name
+            for name, intent in current_intents.items()
+            if intent.entities_names & changed_entities
+        }
+        self.data = Dataset(
+            self.lang, list(current_intents.values()), list(current_entities.values())
         )
-        self.engine.fit(self.data)
+        return touched
+
+    def train(self, intents: Optional[Set[str]] = None):
+        """
+        Trains the engine on the populated data.
+        When the engine is already fitted and ``intents`` is given, only the
+        slot fillers of those intents are refitted. In hierarchical mode, only
+        the engines of the domains of those intents are.
+
+        The served engine keeps answering until the new one is ready.
+        """
+        with self._lock:
+            self._train(intents)
 
+    def _train(self, intents: Optional[Set[str]]):
+        data = self.data
+        if data is None:
+            raise Exception("Please populate the data first")
+
+        # The engine may still read files of the previous one while persisting
+        staging = f"{self.engine_path}.new"
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        profiler = Profiler("train")
+
+        if training["HIERARCHICAL"]:
+            partial = intents is not None and isinstance(self.engine, DomainEngine)
+            engine = fit_domains(
+                data,
+                staging,
+                self.engine_path if partial else None,
+                intents if partial else None,
+                profiler=profiler,
+            )
+        else:
+            partial = intents is not None and isinstance(self.engine, SnipsNLUEngine)
+            if partial:
+                # A copy of the served engine, which other threads are parsing with
+                engine = load_engine(self.engine_path, packed=False)
+            else:
+                engine = SnipsNLUEngine(
+                    config=CONFIG_EN if self.lang == "en" else CONFIG_PT_PT,
+                    random_state=training["SEED"],
+                )
+            fit_engine(engine, data, intents, profiler=profiler)
+        with profiler.stage("lookup"):
+            lookup = TemplateIndex.build(data)
+
+        with profiler.stage("persist"):
+            # Domain engines are persisted while fitting
+            if isinstance(engine, SnipsNLUEngine):
+                engine.persist(staging)
+            write_metadata(staging, engine.dataset_metadata)
+            lookup.persist(f"{staging}/{LOOKUP_FILE}")
         if os.path.exists(self.engine_path):
-            os.system(f"rm -rf {self.engine_path}/")
+            shutil.rmtree(self.engine_path)
+        os.rename(staging, self.engine_path)
+        self._swap(engine, lookup)
+
+        if training["PACK"]:
+            with profiler.stage("pack"):
+                self.pack()
 
-        self.engine.persist(self.engine_path)
+        self.profile = profiler.report()
+        with open(f"{self.engine_path}/{PROFILE_FILE}", "w") as f:
+            json.dump(self.profile, f, indent=2)
+
+    def _swap(self, engine, lookup: Optional[TemplateIndex]):
+        """Serves a newly loaded or trained engine in place of the current one."""
+        batch, entity_cache = self._serve(engine)
+        self.engine, self.lookup, self.batch, self.entity_cache = (
+            engine,
+            lookup,
+            batch,
+            entity_cache,
+        )
         self.loaded = True
 
-    def parse(self, text):
-        if not self.loaded or not isinstance(self.engine, SnipsNLUEngine):
+    def _serve(self, served) -> Tuple[BatchParser, Optional[EntityParseCache]]:
+        """Prepares an engine for parsing, returns its batch parser and entity cache."""
+        token_features.invalidate(self.lang)
+        if isinstance(served, DomainEngine):
+            engines = served.all_engines()
+            batch = DomainBatchParser(served)
+        else:
+            engines = [served]
+            batch = BatchParser(served)
+        entity_cache = None
+        for engine in engines:
+            share_token_features(engine)
+            # Slot resolution is timed apart from the rest of the parse
+            if "_resolve_slots" not in vars(engine):
+                engine._resolve_slots = timed_stage("slots", engine._resolve_slots)
+            # One cache for all the engines, for its stats, warm start and save
+            entity_cache = builtin_entity_cache(engine, entity_cache)
+        if (
+            entity_cache is not None
+            and not entity_cache
+            and inference["BUILTIN_CACHE_WARM_START"]
+        ):
+            entity_cache.restore(warm_start_path(self.lang))
+        return batch, entity_cache
+
+    def save_entity_cache(self):
+        """Keeps the most used builtin entity parses for the next start."""
+        if self.entity_cache is not None and inference["BUILTIN_CACHE_WARM_START"]:
+            self.entity_cache.save(
+                warm_start_path(self.lang), inference["BUILTIN_CACHE_WARM_START"]
+            )
+
+    @property
+    def packed_path(self) -> str:
+        return f"{self.engine_path}/{PACKED_DIR}"
+
+    def pack(self):
+        """Converts the persisted engine to the packed format."""
+        if not os.path.exists(self.engine_path):
+            raise Exception("Please train the engine first")
+        if os.path.exists(f"{self.engine_path}/{HIERARCHY_FILE}"):
+            with open(f"{self.engine_path}/{HIERARCHY_FILE}") as f:
+                hierarchy = json.load(f)
+            for directory in [hierarchy["router"], *hierarchy["domains"].values()]:
+                path = f"{self.engine_path}/{directory}"
+                pack_engine(path, f"{path}/{PACKED_DIR}")
+        else:
+            pack_engine(self.engine_path, self.packed_path)
+
+    @profiled("parse")
+    def parse(self, text, parsed: Optional[dict] = None):
+        """
+        The result of a text, from the AI when the engine is not confident.
+        ``parsed`` is the result of ``recognize(text)``, when already known.
+        """
+        if parsed is None:
+            parsed = self.recognize(text)
+        return self._fallback(text, parsed)
+
+    def recognize(self, text) -> dict:
+        """The result of the lookup index or of the engine, without the AI."""
+        if not self.loaded or not isinstance(
+            self.engine, (SnipsNLUEngine, DomainEngine)
+        ):
             raise AttributeError("Intent recognition Engine not loaded")
-        parsed = self.engine.parse(text)
+        # The engine of a train may replace them meanwhile
+        engine, lookup = self.engine, self.lookup
+        with parse_duration.labels("single").time(), stage("parse"):
+            # Repeats of training utterances do not need the engine
+            parsed = lookup.match(text) if lookup is not None else None
+            if lookup is not None:
+                lookups.labels("miss" if parsed is None else "hit").inc()
+            if parsed is None:
+                parsed = engine.parse(text)
+        return parsed
+
+    def warm_up(self):
+        """Parses a text, so that the first request does not load what is lazy."""
+        if self.loaded:
+            self.engine.parse("warm up")
+
+    def parse_batch(self, texts: List[str]) -> List[Tuple[dict, Processor]]:
+        """Parses many texts at once, classifying their intents together."""
+        if not self.loaded or not isinstance(
+            self.engine, (SnipsNLUEngine, DomainEngine)
+        ):
+            raise AttributeError("Intent recognition Engine not loaded")
+        lookup, batch_parser = self.lookup, self.batch
+        with parse_duration.labels("batch").time(), stage("parse"):
+            results = [
+                lookup.match(text) if lookup is not None else None for text in texts
+            ]
+            pending = [i for i, parsed in enumerate(results) if parsed is None]
+            if lookup is not None:
+                lookups.labels("hit").inc(len(texts) - len(pending))
+                lookups.labels("miss").inc(len(pending))
+            batch = batch_parser.parse([texts[i] for i in pending])
+            for i, parsed in zip(pending, batch):
+                results[i] = parsed
+        return [self._fallback(text, parsed) for text, parsed in zip(texts, results)]
+
+    def _fallback(self, text, parsed):
         processor = Processor.ENGINE
 
         if parsed["intent"]["probability"] < 0.25 or parsed["intent"] is None:
-            parsed, processor = generate(text), Processor.AI
+            with fallback_duration.time(), stage("fallback"):
+                parsed, processor = generate(text), Processor.AI
+        recognitions.labels(processor.value).inc()
 
         parsed["kind"] = "nlu" if processor == Processor.ENGINE else "action_plan"
 
@@ -0,0 +1,223 @@
+import json
+import operator
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from snips_nlu.constants import (
+    CUSTOM_ENTITY_PARSER,
+    CUSTOM_ENTITY_PARSER_USAGE,
+    END,
+    ENTITIES,
+    LANGUAGE,
+    START,
+    UTTERANCES,
+)
+from snips_nlu.dataset import validate_and_format_dataset
+from snips_nlu.entity_parser import CustomEntityParser, CustomEntityParserUsage
+from snips_nlu.entity_parser.builtin_entity_parser import is_builtin_entity
+from snips_nlu.entity_parser.custom_entity_parser import (
+    _merge_entity_utterances,
+    _stem_entity_utterances,
+)
+from snips_nlu.entity_parser.entity_parser import EntityParser
+from snips_nlu.preprocessing import tokenize, tokenize_light
+from snips_nlu.result import parsed_entity
+from src.config import training
+from src.packed import PackedMapping, StringTable
+
+LARGE_ENTITIES_DIR = "large_entities"
+
+
+class LargeEntityParser(EntityParser):
+    """
+    CustomEntityParser whose entities with many values are matched on a
+    sorted table of their values instead of the gazetteer parser.
+
+    Each value is stored as its lowercased tokens joined by spaces, so the
+    values starting with some tokens are next to each other in the table.
+    The values matching at a token are narrowed down one token at a time
+    with binary searches over the memory-mapped table.
+    Unlike the gazetteer parser, a value only matches as a whole.
+    """
+
+    def __init__(self, parser: CustomEntityParser, indexes: Dict[str, PackedMapping]):
+        super().__init__()
+        self.parser = parser
+        # entity -> {value tokens: resolved value}
+        self.indexes = indexes
+        self.language = parser.language
+        self.parser_usage = parser.parser_usage
+
+    @classmethod
+    def build(
+        cls,
+        dataset: dict,
+        large: List[str],
+        parser_usage: CustomEntityParserUsage,
+        resources: dict,
+    ) -> "LargeEntityParser":
+        language = dataset[LANGUAGE]
+        small = dict(
+            dataset,
+            entities={
+                name: entity
+                for name, entity in dataset[ENTITIES].items()
+                if name not in large
+            },
+        )
+        parser = CustomEntityParser.build(small, parser_usage, resources)
+        indexes = {}
+        for name in large:
+            utterances = dataset[ENTITIES][name][UTTERANCES]
+            if parser_usage == CustomEntityParserUsage.WITH_AND_WITHOUT_STEMS:
+                stemmed = _stem_entity_utterances(utterances, language, resources)
+                utterances = _merge_entity_utterances(dict(utterances), stemmed)
+            elif parser_usage == CustomEntityParserUsage.WITH_STEMS:
+                utterances = _stem_entity_utterances(utterances, language, resources)
+            indexes[name] = _index(utterances, language)
+        return cls(parser, indexes)
+
+    def _parse(self, text: str, scope: Optional[List[str]] = None) -> List[dict]:
+        if scope is None:
+            entities = self.parser._parse(text)
+            large = sorted(self.indexes)
+        else:
+            small = [e for e in scope if e not in self.indexes]
+            entities = self.parser._parse(text, small) if small else []
+            large = [e for e in scope if e in self.indexes]
+        if not large:
+            return entities
+
+        tokens = tokenize(text, self.language)
+        words = [token.value.lower() for token in tokens]
+        for name in large:
+            index = self.indexes[name]
+            for start, end, found in _matches(index.keys_table, words):
+                match_range = {START: tokens[start].start, END: tokens[end - 1].end}
+                entities.append(
+                    parsed_entity(
+                        entity_kind=name,
+                        entity_value=text[match_range[START] : match_range[END]],
+                        entity_resolved_value=index.values_table[found],
+                        entity_range=match_range,
+                    )
+                )
+        return entities
+
+    def persist(self, path: Union[str, Path]):
+        path = Path(path)
+        self.parser.persist(path)
+        directory = path / LARGE_ENTITIES_DIR
+        directory.mkdir()
+        # Entity names are not always valid file names
+        files = {name: str(n) for n, name in enumerate(sorted(self.indexes))}
+        for name, file in files.items():
+            self.indexes[name].save(directory / file)
+        with (directory / "metadata.json").open("w", encoding="utf8") as f:
+            json.dump({"entities": files}, f, ensure_ascii=False)
+
+    @classmethod
+    def from_path(cls, path: Union[str, Path]) -> "LargeEntityParser":
+        path = Path(path)
+        directory = path / LARGE_ENTITIES_DIR
+        with (directory / "metadata.json").open(encoding="utf8") as f:
+            files = json.load(f)["entities"]
+        return cls(
+            CustomEntityParser.from_path(path),
+            {
+                name: PackedMapping.open(directory / file)
+                for name, file in files.items()
+            },
+        )
+
+
+def _index(utterances: Dict[str, str], language: str) -> PackedMapping:
+    values: Dict[str, str] = {}
+    # Sorted by resolved value, so that variants conflict the same way as in
+    # the gazetteer parser
+    for variant, value in sorted(utterances.items(), key=operator.itemgetter(1)):
+        key = " ".join(token.lower() for token in tokenize_light(variant, language))
+        if key:
+            values.setdefault(key, value)
+    return PackedMapping.build(values)
+
+
+def _matches(table: StringTable, words: List[str]) -> Iterator[Tuple[int, int, int]]:
+    """The longest values from left to right, as (start, end, index in table)."""
+    start = 0
+    while start < len(words):
+        low, high = 0, len(table)
+        prefix = None
+        longest = None
+        for end in range(start + 1, len(words) + 1):
+            word = words[end - 1]
+            prefix = word if prefix is None else f"{prefix} {word}"
+            low, high = table.prefix_range(prefix, low, high)
+            if low == high:
+                break
+            # A value is the first of the values it is a prefix of
+            if table.raw(low) == prefix.encode("utf8"):
+                longest = (end, low)
+        if longest is None:
+            start += 1
+        else:
+            yield start, longest[0], longest[1]
+            start = longest[0]
+
+
+def build_custom_entity_parser(
+    dataset: dict,
+    parser_usage: CustomEntityParserUsage,
+    resources: dict,
+    size: Optional[int] = None,
+) -> EntityParser:
+    """
+    CustomEntityParser.build, that indexes the entities with at least
+    ``size`` values in a LargeEntityParser, by default the one of the
+    training config at the time of the call.
+    """
+    size = training["LARGE_ENTITY_SIZE"] if size is None else size
+    dataset = validate_and_format_dataset(dataset)
+    large = sorted(
+        name
+        for name, entity in dataset[ENTITIES].items()
+        if not is_builtin_entity(name) and len(entity[UTTERANCES]) >= size
+    )
+    if not large:
+        return CustomEntityParser.build(dataset, parser_usage, resources)
+    return LargeEntityParser.build(dataset, large, parser_usage, resources)
+
+
+def fit_custom_entity_parser(unit, dataset: dict):
+    """ProcessingUnit.fit_custom_entity_parser_if_needed, for large entities."""
+    required = unit.config.get_required_resources()
+    parser_usage = (required or {}).get(CUSTOM_ENTITY_PARSER_USAGE)
+    if parser_usage is None:
+        # Only needed for the slot resolution, which does not use stems
+        parser_usage = CustomEntityParserUsage.WITHOUT_STEMS
+    if unit.custom_entity_parser is None or unit.fitted:
+        unit.load_resources_if_needed(dataset[LANGUAGE])
+        unit.custom_entity_parser = build_custom_entity_parser(
+            dataset, parser_usage, unit.resources
+        )
+    return unit
+
+
+def load_custom_entity_parser(path: Union[str, Path]) -> EntityParser:
+    """CustomEntityParser.from_path, that also loads a LargeEntityParser."""
+    if (Path(path) / LARGE_ENTITIES_DIR).is_dir():
+        return LargeEntityParser.from_path(path)
+    return CustomEntityParser.from_path(path)
+
+
+def large_entity_parser(engine_path: Union[str, Path]) -> dict:
+    """
+    The custom entity parser to load the engine at ``engine_path`` with, as
+    in ``SnipsNLUEngine.from_path(path, **shared)``, when it has large entities.
+    """
+    path = Path(engine_path)
+    with (path / "nlu_engine.json").open(encoding="utf8") as f:
+        directory = json.load(f)["custom_entity_parser"]
+    if directory is None or not (path / directory / LARGE_ENTITIES_DIR).is_dir():
+        return {}
+    return {CUSTOM_ENTITY_PARSER: LargeEntityParser.from_path(path / directory)}
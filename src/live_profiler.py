@@ -0,0 +1,118 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+from typing import Dict, Optional
+
+# One sampling or call profile at a time, their results would mix
+busy = threading.Lock()
+# Only one cProfile can be enabled in a thread, the nested calls are not profiled
+_calls_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _label(code) -> str:
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class StackSampler:
+    """
+    Samples the stacks of every thread of the process, the event loop and the
+    threadpool of the server included, from a thread of its own. The cost for
+    the sampled threads is the GIL taken at each sample, not a hook per call.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """The stacks in the collapsed format of flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+
+class CallProfile:
+    """cProfile stats of the next ``calls`` calls of a function."""
+
+    def __init__(self, calls: int):
+        self.calls = calls
+        self.remaining = calls
+        self.profile = cProfile.Profile()
+        self.done = threading.Event()
+
+    def stats(self, limit: int = 50) -> str:
+        """The stats as text; blocks while a profiled call is running."""
+        if self.remaining == self.calls:
+            return ""
+        out = io.StringIO()
+        # A call still running in another thread would change the profile
+        with _calls_lock:
+            stats = pstats.Stats(self.profile, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return out.getvalue()
+
+
+# Call profiles waiting for calls, by function name
+armed: Dict[str, CallProfile] = {}
+
+
+def profiled(name: str):
+    """Lets the calls of a function be captured by a CallProfile armed for ``name``."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            capture: Optional[CallProfile] = armed.get(name)
+            if capture is None or not _calls_lock.acquire(blocking=False):
+                return function(*args, **kwargs)
+            try:
+                if capture.remaining <= 0:
+                    return function(*args, **kwargs)
+                capture.profile.enable()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    capture.profile.disable()
+                    capture.remaining -= 1
+                    if capture.remaining == 0:
+                        armed.pop(name, None)
+                        capture.done.set()
+            finally:
+                _calls_lock.release()
+
+        return wrapper
+
+    return decorator
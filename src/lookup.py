@@ -0,0 +1,244 @@
+import json
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from snips_nlu.dataset import Dataset
+from snips_nlu.dataset.validation import validate_and_format_dataset
+from snips_nlu.result import (
+    custom_slot,
+    intent_classification_result,
+    parsing_result,
+    unresolved_slot,
+)
+from src.config import training
+
+LOOKUP_FILE = "lookup_index.json"
+
+_WORD = re.compile(r"\w+")
+_SLOT = object()
+
+
+def normalize(text: str) -> Tuple[str, List[int]]:
+    """
+    Lowercases the words of a text and joins them with single spaces.
+    Also returns, for every normalized char, its index in the original text.
+    """
+    chars: List[str] = []
+    offsets: List[int] = []
+    for word in _WORD.finditer(text):
+        if chars:
+            chars.append(" ")
+            offsets.append(offsets[-1] + 1)
+        for i in range(word.start(), word.end()):
+            lowered = text[i].lower()
+            chars.append(lowered)
+            offsets.extend([i] * len(lowered))
+    return "".join(chars), offsets
+
+
+class TemplateIndex:
+    """
+    Answers utterances that repeat a training utterance, either exactly or
+    with other values in its custom entity slots, without running the engine.
+    Utterances shared by several intents are never answered.
+    """
+
+    def __init__(
+        self,
+        exact: Dict[str, list],
+        templates: List[list],
+        entities: Dict[str, dict],
+    ):
+        # normalized utterance -> [intent, [[start, end, slot_name, entity]]]
+        self.exact = exact
+        # [intent, pattern, [[slot_name, entity]], literal chars]
+        self.templates = templates
+        # entity -> {"extensible": bool, "values": {normalized: resolved}}
+        self.entities = entities
+        self._compile()
+
+    @classmethod
+    def build(cls, data: Dataset) -> "TemplateIndex":
+        dataset = validate_and_format_dataset(data)
+        entities = {
+            name: {
+                "extensible": entity["automatically_extensible"],
+                "values": {
+                    normalize(variant)[0]: value
+                    for variant, value in entity["utterances"].items()
+                },
+            }
+            for name, entity in dataset["entities"].items()
+            # Slots of large entities are left to the engine and its index
+            if "automatically_extensible" in entity
+            and len(entity["utterances"]) < training["LARGE_ENTITY_SIZE"]
+        }
+
+        exact: Dict[str, list] = {}
+        templates: Dict[str, list] = {}
+        for intent, intent_data in dataset["intents"].items():
+            for utterance in intent_data["utterances"]:
+                chunks = utterance["data"]
+                entry = _exact_entry(chunks, entities)
+                if entry is not None:
+                    text, slots = entry
+                    if exact.get(text, [intent])[0] != intent:
+                        slots, intent_name = [], None
+                    else:
+                        intent_name = intent
+                    exact[text] = [intent_name, slots]
+                if all(
+                    chunk.get("entity") in entities
+                    for chunk in chunks
+                    if "slot_name" in chunk
+                ):
+                    template = _template(chunks)
+                    if template is not None:
+                        pattern, slots, literal = template
+                        if templates.get(pattern, [intent])[0] != intent:
+                            intent_name = None
+                        else:
+                            intent_name = intent
+                        templates[pattern] = [intent_name, pattern, slots, literal]
+        return cls(exact, list(templates.values()), entities)
+
+    def match(self, text: str) -> Optional[dict]:
+        """A parsing result for ``text``, or None when the index cannot tell."""
+        normalized, offsets = normalize(text)
+        entry = self.exact.get(normalized)
+        if entry is not None:
+            intent, slots = entry
+            resolved = [
+                self._slot(text, normalized, offsets, start, end, slot_name, entity)
+                for start, end, slot_name, entity in slots
+            ]
+            if intent is None or None in resolved:
+                return None
+            return parsing_result(
+                text, intent_classification_result(intent, 1.0), resolved
+            )
+
+        best = None
+        for i in sorted(
+            {i for word in set(normalized.split()) for i in self._buckets.get(word, ())}
+        ):
+            intent, _, slot_names, literal = self.templates[i]
+            found = self._patterns[i].fullmatch(normalized)
+            if found is None:
+                continue
+            slots = []
+            for group, (slot_name, entity) in enumerate(slot_names, 1):
+                start, end = found.span(group)
+                slot = self._slot(
+                    text, normalized, offsets, start, end, slot_name, entity
+                )
+                if slot is None:
+                    break
+                slots.append(slot)
+            else:
+                if intent is None or (best is not None and best[0] != intent):
+                    return None
+                if best is None or literal > best[2]:
+                    best = (intent, slots, literal)
+        if best is None:
+            return None
+        return parsing_result(text, intent_classification_result(best[0], 1.0), best[1])
+
+    def _slot(
+        self,
+        text: str,
+        normalized: str,
+        offsets: List[int],
+        start: int,
+        end: int,
+        slot_name: str,
+        entity: str,
+    ) -> Optional[dict]:
+        """Resolves a slot like the engine would, None when it would drop it."""
+        entity_data = self.entities[entity]
+        value = entity_data["values"].get(normalized[start:end])
+        if value is None and not entity_data["extensible"]:
+            return None
+        match_range = [offsets[start], offsets[end - 1] + 1]
+        slot = unresolved_slot(
+            match_range, text[match_range[0] : match_range[1]], entity, slot_name
+        )
+        return custom_slot(slot, value)
+
+    def _compile(self):
+        self._patterns = [re.compile(pattern) for _, pattern, _, _ in self.templates]
+        # Each template is only tried for inputs containing its rarest word
+        words = [_literal_words(pattern) for _, pattern, _, _ in self.templates]
+        frequency = Counter(word for template in words for word in set(template))
+        self._buckets: Dict[str, List[int]] = {}
+        for i, template in enumerate(words):
+            rarest = min(template, key=lambda word: (frequency[word], word))
+            self._buckets.setdefault(rarest, []).append(i)
+
+    def to_dict(self) -> dict:
+        return {
+            "exact": self.exact,
+            "templates": self.templates,
+            "entities": self.entities,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TemplateIndex":
+        return cls(data["exact"], data["templates"], data["entities"])
+
+    def persist(self, path: str):
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def from_path(cls, path: str) -> "TemplateIndex":
+        with open(path, encoding="utf8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def _exact_entry(
+    chunks: List[dict], entities: Dict[str, dict]
+) -> Optional[Tuple[str, list]]:
+    text = "".join(chunk["text"] for chunk in chunks)
+    normalized, offsets = normalize(text)
+    slots = []
+    start = 0
+    for chunk in chunks:
+        end = start + len(chunk["text"])
+        if "slot_name" in chunk:
+            if chunk["entity"] not in entities:
+                # Builtin entities are resolved by the engine
+                return None
+            covered = [i for i, offset in enumerate(offsets) if start <= offset < end]
+            if not covered:
+                return None
+            slots.append(
+                [covered[0], covered[-1] + 1, chunk["slot_name"], chunk["entity"]]
+            )
+        start = end
+    return normalized, slots
+
+
+def _template(chunks: List[dict]) -> Optional[Tuple[str, list, int]]:
+    parts: list = []
+    slots = []
+    for chunk in chunks:
+        if "slot_name" in chunk:
+            if parts and parts[-1] is _SLOT:
+                return None
+            parts.append(_SLOT)
+            slots.append([chunk["slot_name"], chunk["entity"]])
+        else:
+            parts.extend(normalize(chunk["text"])[0].split())
+    literal = [part for part in parts if part is not _SLOT]
+    if not slots or not literal:
+        return None
+    pattern = " ".join("(.+?)" if part is _SLOT else re.escape(part) for part in parts)
+    return pattern, slots, sum(len(word) for word in literal)
+
+
+def _literal_words(pattern: str) -> List[str]:
+    return [
+        re.sub(r"\\(.)", r"\1", word) for word in pattern.split(" ") if word != "(.+?)"
+    ]
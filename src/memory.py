@@ -0,0 +1,244 @@
+import mmap
+import os
+import sys
+import types
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from src.profiler import peak_rss
+
+# Not walked into: they belong to the code, not to the data
+_SKIPPED = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    types.CodeType,
+    types.FrameType,
+)
+
+
+def rss(pid: str = "self") -> Optional[int]:
+    """The resident set size of a process, in bytes."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Without /proc, the peak is the closest measure
+        return peak_rss() if pid == "self" else None
+
+
+def process_memory(pid: int) -> dict:
+    """
+    RSS of a process, and out of it the pages shared with other processes,
+    like the forked workers, and its own. PSS splits the shared pages
+    between the processes that map them.
+    """
+    memory = {"pid": pid, "rss": rss(str(pid))}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {
+                line.split(":")[0]: int(line.split()[1]) * 1024
+                for line in f
+                if line.strip().endswith("kB")
+            }
+    except OSError:
+        return memory
+    memory["pss"] = fields.get("Pss")
+    memory["shared"] = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    memory["private"] = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    memory["swap"] = fields.get("Swap")
+    return memory
+
+
+def children(pid: int) -> List[int]:
+    """The child processes of ``pid``, like its training or server workers."""
+    found = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                found.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return found
+
+
+class Sizer:
+    """
+    Adds up the memory of object graphs, counting each object once across
+    all the measures, so that resources shared by engines are attributed to
+    the first component measured with them.
+    """
+
+    def __init__(self):
+        self.seen: Set[int] = set()
+
+    def measure(self, *roots) -> Dict[str, int]:
+        """
+        Bytes of the objects reachable from ``roots`` on the Python heap, and
+        of the files they map, which the OS shares between processes.
+        """
+        size = {"bytes": 0, "mapped": 0}
+        pending = list(roots)
+        while pending:
+            obj = pending.pop()
+            if obj is None or id(obj) in self.seen or isinstance(obj, _SKIPPED):
+                continue
+            self.seen.add(id(obj))
+
+            if isinstance(obj, np.ndarray):
+                # Includes the data when the array owns it, else its base does
+                size["bytes"] += sys.getsizeof(obj)
+                pending.append(obj.base)
+                continue
+            if isinstance(obj, mmap.mmap):
+                size["mapped"] += len(obj)
+                continue
+
+            size["bytes"] += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                pending.extend(obj.keys())
+                pending.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                pending.extend(obj)
+            elif not isinstance(obj, (str, bytes, int, float)):
+                pending.extend(_attributes(obj))
+
+            # crfsuite keeps the model it loaded outside the Python heap
+            if obj.__class__.__name__ == "CRF":
+                model = getattr(obj, "modelfile", None)
+                path = getattr(model, "name", None)
+                if path is not None and os.path.exists(path):
+                    kind = "mapped" if getattr(obj, "in_place", False) else "bytes"
+                    size[kind] += os.path.getsize(path)
+        return size
+
+
+def _attributes(obj) -> Iterable:
+    if hasattr(obj, "__dict__"):
+        yield obj.__dict__
+    for cls in type(obj).__mro__:
+        slots = getattr(cls, "__slots__", ())
+        # A single slot can be given as a string
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            value = getattr(obj, slot, None)
+            if value is not None:
+                yield value
+
+
+def engine_components(engine, sizer: Sizer, prefix: str = "") -> Dict[str, dict]:
+    """Memory of the resources, entity parsers and intent parsers of an engine."""
+    from snips_nlu.intent_parser import ProbabilisticIntentParser
+
+    components = {}
+    for name, resource in sorted((engine.resources or {}).items()):
+        components[f"resources.{name}"] = sizer.measure(resource)
+    components["builtin_entity_parser"] = sizer.measure(engine.builtin_entity_parser)
+    components[f"{prefix}custom_entity_parser"] = sizer.measure(
+        engine.custom_entity_parser
+    )
+    for parser in engine.intent_parsers:
+        name = f"{prefix}{parser.unit_name}"
+        if isinstance(parser, ProbabilisticIntentParser):
+            components[f"{name}.intent_classifier"] = sizer.measure(
+                parser.intent_classifier
+            )
+            components[f"{name}.slot_fillers"] = sizer.measure(parser.slot_fillers)
+        else:
+            components[name] = sizer.measure(parser)
+    return components
+
+
+def lingua_franca_tables(sizer: Sizer) -> Dict[str, int]:
+    """Memory of the data the lingua_franca modules loaded, like their word lists."""
+    modules = [
+        module
+        for name, module in list(sys.modules.items())
+        if name.split(".")[0] == "lingua_franca" and module is not None
+    ]
+    return sizer.measure(
+        *(value for module in modules for value in vars(module).values())
+    )
+
+
+def report(kit, master: Optional[int] = None) -> dict:
+    """
+    Memory of the engine of ``kit`` by component, of the caches and of the
+    processes. The components do not add up to the RSS: native memory, like
+    the one of the entity parsers, is only counted through the growth of
+    the RSS while the engine loaded.
+    """
+    from src.domains import DomainEngine
+    from src.features import token_features
+
+    sizer = Sizer()
+    # Before the engine, whose slot fillers refer to the token feature cache
+    caches = {
+        "token_features": sizer.measure(token_features),
+        "entity_cache": sizer.measure(kit.entity_cache),
+    }
+    components: Dict[str, dict] = {}
+    if isinstance(kit.engine, DomainEngine):
+        engines = [("router.", kit.engine.router)]
+        engines += [
+            (f"{domain}.", engine) for domain, engine in kit.engine.engines.items()
+        ]
+    else:
+        engines = [("", kit.engine)] if kit.engine is not None else []
+    for prefix, engine in engines:
+        # Engines with other resources add to the same components
+        for name, size in engine_components(engine, sizer, prefix).items():
+            total = components.setdefault(name, {"bytes": 0, "mapped": 0})
+            total["bytes"] += size["bytes"]
+            total["mapped"] += size["mapped"]
+    components["lookup_index"] = sizer.measure(kit.lookup)
+    components["lingua_franca"] = lingua_franca_tables(sizer)
+
+    before, after = kit.load_rss or (None, None)
+    pid = os.getpid()
+    processes = [process_memory(pid)]
+    if master is not None and master != pid:
+        processes.append(process_memory(master))
+    for child in children(master if master is not None else pid):
+        if child != pid:
+            processes.append(process_memory(child))
+    return {
+        "lang": kit.lang.value,
+        "rss": rss(),
+        "rss_before_load": before,
+        "rss_after_load": after,
+        "components": components,
+        "caches": caches,
+        "processes": processes,
+    }
+
+
+def _mib(value: Optional[int]) -> str:
+    return "-" if value is None else f"{value / 2**20:.1f}"
+
+
+def table(report: dict) -> str:
+    """The report as text, in MiB."""
+    before, after = report["rss_before_load"], report["rss_after_load"]
+    growth = f" (+{_mib(after - before)})" if before is not None and after else ""
+    lines = [
+        f"{report['lang']} engine: RSS {_mib(before)} MiB before load, "
+        f"{_mib(after)} MiB after{growth}, {_mib(report['rss'])} MiB now",
+        f"  {'component':<48}{'heap MiB':>10}{'mapped MiB':>12}",
+    ]
+    for title in ("components", "caches"):
+        for name, size in sorted(
+            report[title].items(), key=lambda item: -item[1]["bytes"]
+        ):
+            lines.append(
+                f"  {name:<48}{_mib(size['bytes']):>10}{_mib(size['mapped']):>12}"
+            )
+    lines.append(f"  {'process':<12}{'rss MiB':>10}{'pss MiB':>10}{'private MiB':>13}")
+    for process in report["processes"]:
+        lines.append(
+            f"  {process['pid']:<12}{_mib(process['rss']):>10}"
+            f"{_mib(process.get('pss')):>10}{_mib(process.get('private')):>13}"
+        )
+    return "\n".join(lines)
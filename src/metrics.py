@@ -0,0 +1,293 @@
+import functools
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds, from a lookup index hit to a slow AI answer
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class _Owner:
+    """Lives in the local storage of a thread, and is freed when it exits."""
+
+    __slots__ = ("__weakref__",)
+
+
+class _Shards:
+    """
+    Preallocated values, one copy per thread. A thread only writes its own
+    copy, so updating needs no lock; the copies are added when read.
+
+    The copy of a thread that exits is added to the retired values, so the
+    threads of the threadpool, which come and go, leave no copies behind.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._shards: Dict[int, List[float]] = {}
+        self._retired: List[float] = [0] * size
+        self._lock = threading.Lock()
+
+    def mine(self) -> List[float]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = [0] * self.size
+            owner = self._local.owner = _Owner()
+            weakref.finalize(owner, self._retire, shard).atexit = False
+            with self._lock:
+                self._shards[id(shard)] = shard
+        return shard
+
+    def _retire(self, shard: List[float]):
+        with self._lock:
+            del self._shards[id(shard)]
+            self._retired = [a + b for a, b in zip(self._retired, shard)]
+
+    def total(self) -> List[float]:
+        with self._lock:
+            shards = [self._retired, *self._shards.values()]
+        return [sum(column) for column in zip(*shards)]
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Bucket counts, the +Inf count, then the sum
+        self._values = _Shards(len(self.buckets) + 2)
+
+    def observe(self, value: float):
+        shard = self._values.mine()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        *counts, total = self._values.total()
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{{{_join(labels, le)}}} {cumulative}")
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {total}")
+        lines.append(f"{name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self):
+        self._values = _Shards(1)
+
+    def inc(self, amount: float = 1):
+        self._values.mine()[0] += amount
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        suffix = f"{{{labels}}}" if labels else ""
+        return [f"{name}_total{suffix} {self._values.total()[0]}"]
+
+
+class Metric:
+    """A counter or histogram family, with one child per label values."""
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        **options,
+    ):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._factory = functools.partial(
+            Histogram if kind == "histogram" else Counter, **options
+        )
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._children[()] = self._factory()
+        registry.append(self)
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in sorted(self._children.items()):
+            labels = ",".join(
+                f'{label}="{_escape(value)}"'
+                for label, value in zip(self.label_names, values)
+            )
+            lines.extend(child.samples(self.name, labels))
+        return lines
+
+    # Without labels, the family is its only child
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def time(self) -> _Timer:
+        return self._children[()].time()
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+
+class Collected:
+    """Values read from elsewhere when the metrics are rendered, like cache stats."""
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        collect: Callable[[], Dict[Tuple[str, ...], float]],
+    ):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.collect = collect
+        registry.append(self)
+
+    def render(self) -> List[str]:
+        suffix = "_total" if self.kind == "counter" else ""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, value in sorted(self.collect().items()):
+            labels = ",".join(
+                f'{label}="{_escape(v)}"' for label, v in zip(self.label_names, values)
+            )
+            lines.append(f"{self.name}{suffix}{{{labels}}} {value}")
+        return lines
+
+
+def _join(*labels: str) -> str:
+    return ",".join(label for label in labels if label)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+registry: List = []
+
+
+def render() -> str:
+    """All the metrics in the Prometheus text format."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def timed(metric: Metric):
+    """Records the time of every call of a function, labeled with its name."""
+
+    def decorator(function):
+        child = metric.labels(function.__name__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with child.time():
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+request_duration = Metric(
+    "histogram",
+    "avi_request_duration_seconds",
+    "Time to answer a request, by route.",
+    ("method", "route"),
+)
+parse_duration = Metric(
+    "histogram",
+    "avi_parse_duration_seconds",
+    "Time of the lookup index and the engine on a text, or on a whole batch.",
+    ("mode",),
+)
+fallback_duration = Metric(
+    "histogram",
+    "avi_ai_fallback_duration_seconds",
+    "Time to get an action plan from the AI.",
+)
+serialization_duration = Metric(
+    "histogram",
+    "avi_serialization_duration_seconds",
+    "Time to encode the JSON body of a response.",
+)
+lingua_franca_duration = Metric(
+    "histogram",
+    "avi_lingua_franca_duration_seconds",
+    "Time of the lingua_franca calls, by function.",
+    ("function",),
+)
+recognitions = Metric(
+    "counter",
+    "avi_recognitions",
+    "Texts recognized, by the processor that answered them.",
+    ("processor",),
+)
+lookups = Metric(
+    "counter",
+    "avi_lookup_index",
+    "Texts the lookup index answered (hit) or left to the engine (miss).",
+    ("result",),
+)
+errors = Metric(
+    "counter",
+    "avi_errors",
+    "Requests that failed, by error code.",
+    ("code",),
+)
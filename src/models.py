@@ -125,6 +125,29 @@ class Data(BaseModel):
     )
 
 
+class RemovedItem(BaseModel):
+    """Reference to an intent or entity to remove from the dataset."""
+
+    type: Literal["intent", "entity"] = Field(
+        ..., description="Whether an intent or an entity is removed"
+    )
+    name: str = Field(..., description="Name of the intent or entity", min_length=1)
+
+
+class DataPatch(BaseModel):
+    """Diff to apply on the current dataset of a language."""
+
+    language: Lang = Field(..., description="Target language for this diff")
+    upsert: List[TrainingItem] = Field(
+        default_factory=list,
+        description="Entities and intents to add, or to replace when one with the same name exists",
+    )
+    remove: List[RemovedItem] = Field(
+        default_factory=list,
+        description="Entities and intents to remove from the dataset",
+    )
+
+
 class Range(BaseModel):
     """Character position range in the input text."""
 
@@ -225,6 +248,55 @@ class Processor(str, Enum):
     ENGINE = "engine"  # Processed by NLU engine
 
 
+class ProfiledFunction(str, Enum):
+    """Function whose next calls can be profiled."""
+
+    PARSE = "parse"  # IntentKit.parse
+    GENERATE = "generate"  # AI fallback
+
+
+class MemoryUsage(BaseModel):
+    """Memory taken by a part of the server."""
+
+    bytes: int = Field(..., description="Bytes on the heap of the process", ge=0)
+    mapped: int = Field(
+        ..., description="Bytes of files mapped in memory, shared by processes", ge=0
+    )
+
+
+class ProcessMemory(BaseModel):
+    """Memory of a process of the server."""
+
+    pid: int = Field(..., description="Process id")
+    rss: Optional[int] = Field(None, description="Resident set size in bytes")
+    pss: Optional[int] = Field(
+        None, description="RSS with the shared pages split between their processes"
+    )
+    shared: Optional[int] = Field(None, description="Resident bytes shared")
+    private: Optional[int] = Field(None, description="Resident bytes of its own")
+    swap: Optional[int] = Field(None, description="Bytes swapped out")
+
+
+class MemoryReport(BaseModel):
+    """Memory of the engine, caches and processes of the server."""
+
+    lang: Lang = Field(..., description="Language of the engine")
+    rss: Optional[int] = Field(None, description="Resident set size in bytes")
+    rss_before_load: Optional[int] = Field(
+        None, description="RSS before the engine was loaded"
+    )
+    rss_after_load: Optional[int] = Field(
+        None, description="RSS after the engine was loaded"
+    )
+    components: Dict[str, MemoryUsage] = Field(
+        ..., description="Memory of the engine by component"
+    )
+    caches: Dict[str, MemoryUsage] = Field(..., description="Memory of the caches")
+    processes: List[ProcessMemory] = Field(
+        ..., description="This process, then the master and workers"
+    )
+
+
 class Route(BaseModel):
     """API route information."""
 
@@ -252,6 +324,26 @@ class Installed(BaseModel):
     )
 
 
+class StageProfile(BaseModel):
+    """Time and memory spent on one stage of the training."""
+
+    name: str = Field(..., description="Pipeline unit, intent or step the stage covers")
+    wall: float = Field(..., description="Elapsed time, in seconds")
+    cpu: float = Field(
+        ..., description="CPU time of the process that ran the stage, in seconds"
+    )
+    peak_rss: Optional[int] = Field(
+        None,
+        description="Peak resident memory of that process when the stage ended, in bytes",
+    )
+    rss_growth: Optional[int] = Field(
+        None, description="How much the stage raised that peak, in bytes"
+    )
+    stages: List["StageProfile"] = Field(
+        default=[], description="Stages nested in this one"
+    )
+
+
 class EngineTrain(BaseModel):
     """Training operation result."""
 
@@ -260,6 +352,19 @@ class EngineTrain(BaseModel):
         ..., description="Type of training operation that was performed"
     )
     lang: Lang = Field(..., description="Language for which the engine was trained")
+    profile: Optional[StageProfile] = Field(
+        None, description="Breakdown of the last training of this engine"
+    )
+
+
+class Patched(BaseModel):
+    """Result of a partial retraining."""
+
+    result: bool = Field(..., description="Whether the retraining succeeded")
+    lang: Lang = Field(..., description="Language for which the engine was trained")
+    retrained: List[str] = Field(
+        ..., description="Intents whose slot fillers were refitted"
+    )
 
 
 class Created(BaseModel):
@@ -270,6 +375,19 @@ class Created(BaseModel):
     )
 
 
+class PopulateProgress(BaseModel):
+    """Progress of a streamed dataset upload."""
+
+    language: Lang = Field(..., description="Language of the uploaded dataset")
+    state: Literal["receiving", "done", "failed"] = Field(
+        default="receiving", description="Current state of the upload"
+    )
+    bytes: int = Field(default=0, description="Bytes received so far", ge=0)
+    records: int = Field(default=0, description="Documents read so far", ge=0)
+    intents: int = Field(default=0, description="Intents converted so far", ge=0)
+    entities: int = Field(default=0, description="Entities converted so far", ge=0)
+
+
 # --- FIX 2: Define the discriminated Union explicitly using Annotated ---
 RecognitionResult = Annotated[Union[ActionPlan, NLUResult], Field(discriminator="kind")]
 
@@ -286,6 +404,56 @@ class Recognized(BaseModel):
     )
 
 
+class RecognitionRequest(BaseModel):
+    """A text to recognize, sent by a device on its channel."""
+
+    id: str = Field(
+        ..., description="Correlation id, sent back with the result", max_length=128
+    )
+    # Partial transcripts start with single letters
+    text: str = Field(
+        ..., description="Sentence to recognize", min_length=1, max_length=250
+    )
+    partial: bool = Field(
+        False,
+        description="Whether the text is a partial transcript of the utterance, the next ones having the same id until the final one",
+    )
+
+
+class CacheStats(BaseModel):
+    """Usage of an inference cache."""
+
+    entries: int = Field(..., description="Entries currently cached", ge=0)
+    max_entries: int = Field(..., description="Entries kept at most", ge=0)
+    bytes: Optional[int] = Field(
+        None, description="Approximate memory used, when measured", ge=0
+    )
+    hits: int = Field(..., description="Lookups answered by the cache", ge=0)
+    misses: int = Field(..., description="Lookups not in the cache", ge=0)
+    hit_rate: float = Field(
+        ..., description="Share of the lookups answered", ge=0.0, le=1.0
+    )
+
+
+class Utterances(BaseModel):
+    """Texts to recognize in a single request."""
+
+    texts: List[Annotated[str, Field(min_length=2, max_length=250)]] = Field(
+        ...,
+        description="Sentences to recognize the intents of",
+        min_length=1,
+        max_length=256,
+    )
+
+
+class RecognizedBatch(BaseModel):
+    """Recognition results of a batch, in the order of its texts."""
+
+    results: List[Recognized] = Field(
+        ..., description="One recognition result for each text"
+    )
+
+
 # Exception classes
 class ErrorResponse(BaseModel):
     code: str
@@ -337,6 +505,26 @@ class WrongDataset(AppError):
     code = "DATASET_ERROR"
 
 
+class NoUpload(AppError):
+    """Error when asking for the progress of an upload that never started."""
+
+    status_code = 404
+    code = "NO_UPLOAD"
+
+    def __init__(self):
+        super().__init__("No dataset was streamed yet.")
+
+
+class UnsupportedMediaType(AppError):
+    """Error for a streamed dataset in an unknown format."""
+
+    status_code = 415
+    code = "UNSUPPORTED_MEDIA_TYPE"
+
+    def __init__(self, media_type: str):
+        super().__init__(f"Unsupported dataset media type: {media_type}")
+
+
 class WrongLanguage(AppError):
     """Error when dataset language doesn't match expected language."""
 
@@ -345,3 +533,35 @@ class WrongLanguage(AppError):
 
     def __init__(self, lang: Lang):
         super().__init__(f"Wrong Language Dataset expected, {lang}")
+
+
+class Unauthorized(AppError):
+    """Error for an admin request without the admin token."""
+
+    status_code = 401
+    code = "UNAUTHORIZED"
+
+    def __init__(self):
+        super().__init__("A valid admin token is required.")
+
+
+class ForkedWorkers(AppError):
+    """Error when changing the engine of a server with many worker processes."""
+
+    status_code = 409
+    code = "FORKED_WORKERS"
+
+    def __init__(self):
+        super().__init__(
+            "The dataset and engine can only be changed on a server with one worker."
+        )
+
+
+class ProfilerBusy(AppError):
+    """Error when a profile is asked for while another one runs."""
+
+    status_code = 409
+    code = "PROFILER_BUSY"
+
+    def __init__(self):
+        super().__init__("Another profile is already running.")
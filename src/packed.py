@@ -0,0 +1,461 @@
+import json
+import mmap
+import shutil
+from collections.abc import Mapping, Sequence, Set
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from snips_nlu import SnipsNLUEngine, __model_version__
+from snips_nlu.constants import (
+    BUILTIN_ENTITY_PARSER,
+    CUSTOM_ENTITY_PARSER,
+    GAZETTEERS,
+    METADATA,
+    NOISE,
+    RESOURCES,
+    STEMS,
+    STOP_WORDS,
+    WORD_CLUSTERS,
+)
+from snips_nlu.entity_parser import BuiltinEntityParser, CustomEntityParser
+from snips_nlu.exceptions import IncompatibleModelError, LoadingError
+from snips_nlu.intent_classifier import IntentClassifier, LogRegIntentClassifier
+from snips_nlu.intent_classifier.featurizer import (
+    CooccurrenceVectorizer,
+    Featurizer,
+    TfidfVectorizer,
+)
+from snips_nlu.intent_classifier.log_reg_classifier import LOG_REG_ARGS
+from snips_nlu.intent_parser import IntentParser, ProbabilisticIntentParser
+from snips_nlu.preprocessing import tokenize_light
+from snips_nlu.resources import (
+    _get_noise,
+    _get_stop_words,
+    _load_gazetteer,
+    _load_stems,
+    _load_word_clusters,
+)
+from snips_nlu.slot_filler import CRFSlotFiller, SlotFiller
+from snips_nlu.slot_filler.crf_slot_filler import _crf_model_from_path
+
+PACKED_DIR = "packed"
+FORMAT_VERSION = 1
+
+
+class StringTable(Sequence):
+    """
+    Strings stored back to back as utf-8 in a ``.strings`` file, with their
+    offsets in a ``.offsets.npy`` array. Both are memory-mapped.
+    A table written from sorted strings can be searched with ``find``.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.offsets = np.load(f"{path}.offsets.npy", mmap_mode="r")
+        with open(f"{path}.strings", "rb") as f:
+            size = f.seek(0, 2)
+            self.data = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            )
+
+    @staticmethod
+    def write(path: Union[str, Path], strings: Iterable[str]):
+        StringTable.build(strings).save(path)
+
+    @classmethod
+    def build(cls, strings: Iterable[str]) -> "StringTable":
+        """A table held in memory, until it is saved."""
+        encoded = [s.encode("utf8") for s in strings]
+        table = cls.__new__(cls)
+        table.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(s) for s in encoded], out=table.offsets[1:])
+        table.data = b"".join(encoded)
+        return table
+
+    def save(self, path: Union[str, Path]):
+        np.save(f"{path}.offsets.npy", np.asarray(self.offsets))
+        with open(f"{path}.strings", "wb") as f:
+            f.write(self.data[:])
+
+    def raw(self, index: int) -> bytes:
+        return self.data[int(self.offsets[index]) : int(self.offsets[index + 1])]
+
+    def find(self, value: str) -> int:
+        """Index of ``value`` in a sorted table, or -1."""
+        target = value.encode("utf8")
+        low = self._bisect(target, 0, len(self))
+        if low < len(self) and self.raw(low) == target:
+            return low
+        return -1
+
+    def prefix_range(
+        self, prefix: str, low: int = 0, high: Optional[int] = None
+    ) -> Tuple[int, int]:
+        """
+        Indexes ``[start, end)`` of the strings of a sorted table that start
+        with ``prefix``, searched between ``low`` and ``high``.
+        """
+        target = prefix.encode("utf8")
+        high = len(self) if high is None else high
+        # No utf-8 byte is 0xff, so it sorts after every string with the prefix
+        return self._bisect(target, low, high), self._bisect(
+            target + b"\xff", low, high
+        )
+
+    def _bisect(self, target: bytes, low: int, high: int) -> int:
+        while low < high:
+            middle = (low + high) // 2
+            if self.raw(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.raw(index).decode("utf8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class PackedMapping(Mapping):
+    """Read-only dict over a sorted key table and the values in the same order."""
+
+    def __init__(self, keys: StringTable, values: Union[StringTable, np.ndarray]):
+        self.keys_table = keys
+        self.values_table = values
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "PackedMapping":
+        keys = StringTable(f"{path}.keys")
+        if Path(f"{path}.values.npy").exists():
+            return cls(keys, np.load(f"{path}.values.npy", mmap_mode="r"))
+        return cls(keys, StringTable(f"{path}.values"))
+
+    @staticmethod
+    def write(path: Union[str, Path], mapping: Mapping):
+        # Code point order is also the utf-8 byte order StringTable.find uses
+        keys = sorted(mapping)
+        StringTable.write(f"{path}.keys", keys)
+        values = [mapping[k] for k in keys]
+        if values and all(isinstance(v, int) for v in values):
+            np.save(f"{path}.values.npy", np.array(values, dtype=np.int64))
+        else:
+            StringTable.write(f"{path}.values", values)
+
+    @classmethod
+    def build(cls, mapping: Mapping) -> "PackedMapping":
+        """A mapping of strings held in memory, until it is saved."""
+        keys = sorted(mapping)
+        return cls(StringTable.build(keys), StringTable.build(mapping[k] for k in keys))
+
+    def save(self, path: Union[str, Path]):
+        self.keys_table.save(f"{path}.keys")
+        if isinstance(self.values_table, StringTable):
+            self.values_table.save(f"{path}.values")
+        else:
+            np.save(f"{path}.values.npy", np.asarray(self.values_table))
+
+    def __getitem__(self, key: str) -> Any:
+        index = self.keys_table.find(key) if isinstance(key, str) else -1
+        if index < 0:
+            raise KeyError(key)
+        value = self.values_table[index]
+        return int(value) if isinstance(value, np.integer) else value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_table)
+
+    def __len__(self) -> int:
+        return len(self.keys_table)
+
+
+class PackedSet(Set):
+    """Read-only set over a sorted string table."""
+
+    def __init__(self, table: StringTable):
+        self.table = table
+
+    @staticmethod
+    def write(path: Union[str, Path], values: Iterable[str]):
+        StringTable.write(path, sorted(values))
+
+    def __contains__(self, value) -> bool:
+        return isinstance(value, str) and self.table.find(value) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.table)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+def pack_engine(source: Union[str, Path], destination: Union[str, Path]):
+    """
+    Converts an engine persisted by SnipsNLUEngine.persist to the packed
+    layout. Weights become .npy arrays and word clusters, gazetteers, stems
+    and the tf-idf vocabulary become string tables. Everything else is
+    copied as it is.
+    """
+    source, destination = Path(source), Path(destination)
+    if destination.exists():
+        shutil.rmtree(destination)
+    shutil.copytree(source, destination, ignore=shutil.ignore_patterns(PACKED_DIR))
+
+    model = _read_json(destination / "nlu_engine.json")
+    metadata = model["dataset_metadata"]
+    if metadata is not None:
+        resources_dir = destination / "resources" / metadata["language_code"]
+        if resources_dir.is_dir():
+            _pack_resources(resources_dir)
+
+    for parser_name in model["intent_parsers"]:
+        classifier_dir = destination / parser_name / "intent_classifier"
+        if _unit_name(classifier_dir) == LogRegIntentClassifier.unit_name:
+            _pack_classifier(classifier_dir)
+
+    _write_json(destination / "packed.json", {"format": FORMAT_VERSION})
+
+
+def is_packed(path: Union[str, Path]) -> bool:
+    packed = Path(path) / "packed.json"
+    return packed.exists() and _read_json(packed)["format"] == FORMAT_VERSION
+
+
+def load_packed(path: Union[str, Path], **shared) -> SnipsNLUEngine:
+    """SnipsNLUEngine.from_path for an engine converted with pack_engine."""
+    path = Path(path)
+    if not is_packed(path):
+        raise LoadingError(f"No packed engine at {path}")
+
+    model = _read_json(path / "nlu_engine.json")
+    if model.get("model_version") != __model_version__:
+        raise IncompatibleModelError(model.get("model_version"))
+
+    metadata = model["dataset_metadata"]
+    if shared.get(RESOURCES) is None and metadata is not None:
+        resources_dir = path / "resources" / metadata["language_code"]
+        if resources_dir.is_dir():
+            shared[RESOURCES] = load_packed_resources(resources_dir)
+    if shared.get(BUILTIN_ENTITY_PARSER) is None and model["builtin_entity_parser"]:
+        shared[BUILTIN_ENTITY_PARSER] = BuiltinEntityParser.from_path(
+            path / model["builtin_entity_parser"]
+        )
+    if shared.get(CUSTOM_ENTITY_PARSER) is None and model["custom_entity_parser"]:
+        shared[CUSTOM_ENTITY_PARSER] = CustomEntityParser.from_path(
+            path / model["custom_entity_parser"]
+        )
+
+    config = SnipsNLUEngine.config_type.from_dict(model["config"])
+    engine = SnipsNLUEngine(config=config, **shared)
+    engine.dataset_metadata = metadata
+    engine.intent_parsers = []
+    for parser_name, parser_config in zip(
+        model["intent_parsers"], config.intent_parsers_configs
+    ):
+        if parser_config.unit_name == ProbabilisticIntentParser.unit_name:
+            parser = _load_probabilistic_parser(path / parser_name, shared)
+        else:
+            parser = IntentParser.load_from_path(
+                path / parser_name, parser_config.unit_name, **shared
+            )
+        engine.intent_parsers.append(parser)
+    return engine
+
+
+def load_packed_resources(path: Path) -> dict:
+    metadata = _read_json(path / "metadata.json")
+    stems = None
+    if metadata["stems"] is not None:
+        stems = PackedMapping.open(path / "stemming" / metadata["stems"])
+    return {
+        METADATA: metadata,
+        WORD_CLUSTERS: {
+            name: PackedMapping.open(path / "word_clusters" / name)
+            for name in metadata["word_clusters"]
+        },
+        GAZETTEERS: {
+            name: PackedSet(StringTable(path / "gazetteers" / name))
+            for name in metadata["gazetteers"]
+        },
+        STOP_WORDS: _get_stop_words(path, metadata["stop_words"]),
+        NOISE: _get_noise(path, metadata["noise"]),
+        STEMS: stems,
+    }
+
+
+def own_crf_model(slot_filler: SlotFiller):
+    """
+    Gives a slot filler loaded from a packed engine its own copy of the CRF
+    model, so that the engine directory can be replaced under it.
+    """
+    model = getattr(slot_filler, "crf_model", None)
+    if getattr(model, "in_place", False):
+        slot_filler.crf_model = _crf_model_from_path(Path(model.modelfile.name))
+
+
+def _pack_resources(path: Path):
+    metadata = _read_json(path / "metadata.json")
+    for name in metadata["word_clusters"]:
+        text = (path / "word_clusters" / name).with_suffix(".txt")
+        PackedMapping.write(path / "word_clusters" / name, _load_word_clusters(text))
+        text.unlink()
+    for name in metadata["gazetteers"]:
+        text = (path / "gazetteers" / name).with_suffix(".txt")
+        PackedSet.write(path / "gazetteers" / name, _load_gazetteer(text))
+        text.unlink()
+    if metadata["stems"] is not None:
+        text = (path / "stemming" / metadata["stems"]).with_suffix(".txt")
+        PackedMapping.write(path / "stemming" / metadata["stems"], _load_stems(text))
+        text.unlink()
+
+
+def _pack_classifier(path: Path):
+    model = _read_json(path / "intent_classifier.json")
+    for name in ("coeffs", "intercept"):
+        if model[name] is not None:
+            np.save(path / f"{name}.npy", np.array(model[name], dtype=np.float64))
+            model[name] = f"{name}.npy"
+    _write_json(path / "intent_classifier.json", model)
+
+    if model["featurizer"] is None:
+        return
+    featurizer = _read_json(path / model["featurizer"] / "featurizer.json")
+    if featurizer["tfidf_vectorizer"]:
+        vectorizer_dir = path / model["featurizer"] / featurizer["tfidf_vectorizer"]
+        vectorizer = _read_json(vectorizer_dir / "vectorizer.json")
+        if vectorizer["vectorizer"]:
+            PackedMapping.write(
+                vectorizer_dir / "vocab", vectorizer["vectorizer"]["vocab"]
+            )
+            np.save(
+                vectorizer_dir / "idf_diag.npy",
+                np.array(vectorizer["vectorizer"]["idf_diag"], dtype=np.float64),
+            )
+            vectorizer["vectorizer"] = {"vocab": "vocab", "idf_diag": "idf_diag.npy"}
+        _write_json(vectorizer_dir / "vectorizer.json", vectorizer)
+
+
+def _load_probabilistic_parser(path: Path, shared: dict) -> ProbabilisticIntentParser:
+    model = _read_json(path / "intent_parser.json")
+    config = ProbabilisticIntentParser.config_type.from_dict(model["config"])
+    parser = ProbabilisticIntentParser(config=config, **shared)
+
+    classifier_dir = path / "intent_classifier"
+    classifier_name = config.intent_classifier_config.unit_name
+    if not classifier_dir.exists():
+        parser.intent_classifier = None
+    elif classifier_name == LogRegIntentClassifier.unit_name:
+        parser.intent_classifier = _load_classifier(classifier_dir, shared)
+    else:
+        parser.intent_classifier = IntentClassifier.load_from_path(
+            classifier_dir, classifier_name, **shared
+        )
+
+    slot_filler_name = config.slot_filler_config.unit_name
+    for slot_filler in model["slot_fillers"]:
+        slot_filler_dir = path / slot_filler["slot_filler_name"]
+        if slot_filler_name == CRFSlotFiller.unit_name:
+            unit = _load_crf_slot_filler(slot_filler_dir, shared)
+        else:
+            unit = SlotFiller.load_from_path(
+                slot_filler_dir, slot_filler_name, **shared
+            )
+        parser.slot_fillers[slot_filler["intent"]] = unit
+    return parser
+
+
+def _load_classifier(path: Path, shared: dict) -> LogRegIntentClassifier:
+    from sklearn.linear_model import SGDClassifier
+
+    model = _read_json(path / "intent_classifier.json")
+    config = LogRegIntentClassifier.config_type.from_dict(model["config"])
+    classifier = LogRegIntentClassifier(config=config, **shared)
+    classifier.intent_list = model["intent_list"]
+    if model["coeffs"] is not None and model["intercept"] is not None:
+        classifier.classifier = SGDClassifier(**LOG_REG_ARGS)
+        classifier.classifier.coef_ = np.load(path / model["coeffs"], mmap_mode="r")
+        classifier.classifier.intercept_ = np.load(path / model["intercept"])
+        classifier.classifier.t_ = model["t_"]
+    if model["featurizer"] is not None:
+        classifier.featurizer = _load_featurizer(path / model["featurizer"], shared)
+    return classifier
+
+
+def _load_featurizer(path: Path, shared: dict) -> Featurizer:
+    model = _read_json(path / "featurizer.json")
+    featurizer = Featurizer(model["config"], **shared)
+    featurizer.language = model["language_code"]
+    if model["tfidf_vectorizer"]:
+        featurizer.tfidf_vectorizer = _load_tfidf_vectorizer(
+            path / model["tfidf_vectorizer"], shared
+        )
+    if model["cooccurrence_vectorizer"]:
+        featurizer.cooccurrence_vectorizer = CooccurrenceVectorizer.from_path(
+            path / model["cooccurrence_vectorizer"], **shared
+        )
+    return featurizer
+
+
+def _load_tfidf_vectorizer(path: Path, shared: dict) -> TfidfVectorizer:
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import TfidfTransformer
+    from sklearn.feature_extraction.text import TfidfVectorizer as SklearnTfidf
+
+    model = _read_json(path / "vectorizer.json")
+    vectorizer = TfidfVectorizer(model["config"], **shared)
+    vectorizer._language = model["language_code"]
+    scope = model["builtin_entity_scope"]
+    vectorizer.builtin_entity_scope = set(scope) if scope is not None else None
+
+    if model["vectorizer"]:
+        idf = np.load(path / model["vectorizer"]["idf_diag"])
+        transformer = TfidfTransformer()
+        transformer._idf_diag = sp.diags(idf, format="csr")
+        language = vectorizer._language
+        sklearn_vectorizer = SklearnTfidf(
+            tokenizer=lambda x: tokenize_light(x, language)
+        )
+        sklearn_vectorizer.vocabulary_ = PackedMapping.open(
+            path / model["vectorizer"]["vocab"]
+        )
+        sklearn_vectorizer._tfidf = transformer
+        vectorizer._tfidf_vectorizer = sklearn_vectorizer
+    return vectorizer
+
+
+def _load_crf_slot_filler(path: Path, shared: dict) -> CRFSlotFiller:
+    from sklearn_crfsuite import CRF
+
+    model = _read_json(path / "slot_filler.json")
+    config = CRFSlotFiller.config_type.from_dict(model["config"])
+    slot_filler = CRFSlotFiller(config=config, **shared)
+    slot_filler.language = model["language_code"]
+    slot_filler.intent = model["intent"]
+    slot_filler.slot_name_mapping = model["slot_name_mapping"]
+    if model["crf_model_file"] is not None:
+        # Read in place instead of through a temporary copy
+        slot_filler.crf_model = CRF(model_filename=str(path / model["crf_model_file"]))
+        slot_filler.crf_model.in_place = True
+    return slot_filler
+
+
+def _unit_name(path: Path) -> Optional[str]:
+    metadata = path / "metadata.json"
+    return _read_json(metadata)["unit_name"] if metadata.exists() else None
+
+
+def _read_json(path: Path) -> Any:
+    with open(path, encoding="utf8") as f:
+        return json.load(f)
+
+
+def _write_json(path: Path, value: Any):
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(value, f, ensure_ascii=False)
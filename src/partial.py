@@ -0,0 +1,78 @@
+import re
+from typing import Dict, Optional, Tuple
+
+from src.config import inference
+from src.kit import IntentKit
+from src.models import Processor
+
+WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> Tuple[str, ...]:
+    return tuple(word.lower() for word in WORD.findall(text))
+
+
+class PartialSession:
+    """
+    Successive partial transcripts of one utterance, as a speech recognizer
+    produces them while the user speaks.
+
+    The last word of a partial transcript may still be cut, so a partial is
+    only parsed when its complete words changed, and in full once the
+    recognizer repeats it, which happens when the user pauses. Parses are
+    kept by text, so the final transcript usually has its engine result
+    ready, and only the AI fallback is left to decide. Longer prefixes also
+    find the features of the tokens they share with the previous ones in
+    the token feature cache.
+
+    Partials never fall back to the AI. The intent is called stable once
+    ``inference["PARTIAL_STABLE_PARSES"]`` parses in a row agree on it.
+    """
+
+    def __init__(self, kit: IntentKit):
+        self.kit = kit
+        self.results: Dict[str, dict] = {}
+        self.previous: Optional[str] = None
+        self.parsed: Optional[Tuple[str, ...]] = None
+        self.intent: Optional[str] = None
+        self.agreeing = 0
+
+    @property
+    def stable(self) -> bool:
+        return (
+            self.intent is not None
+            and self.agreeing >= inference["PARTIAL_STABLE_PARSES"]
+        )
+
+    def partial(self, text: str) -> Optional[dict]:
+        """The engine result of a partial transcript, None when it did not change."""
+        text = text.strip()
+        repeated, self.previous = text == self.previous, text
+        if not repeated:
+            # Without its last word, which may still be spoken
+            text = text.rpartition(" ")[0].rstrip()
+        words = _words(text)
+        if not words or words == self.parsed:
+            return None
+        self.parsed = words
+
+        parsed = self._recognize(text)
+        intent = parsed["intent"]
+        name = intent["intentName"] if intent is not None else None
+        if name is not None and name == self.intent:
+            self.agreeing += 1
+        else:
+            self.intent, self.agreeing = name, 1 if name is not None else 0
+        return parsed
+
+    def final(self, text: str) -> Tuple[dict, Processor]:
+        """The result of the final transcript, as ``IntentKit.parse`` gives it."""
+        text = text.strip()
+        parsed = self.results.get(text)
+        # The fallback marks the result, which the session keeps
+        return self.kit.parse(text, dict(parsed) if parsed is not None else None)
+
+    def _recognize(self, text: str) -> dict:
+        if text not in self.results:
+            self.results[text] = self.kit.recognize(text)
+        return self.results[text]
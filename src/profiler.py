@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss() -> Optional[int]:
+    """The highest resident set size of the process so far, in bytes."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def process_age() -> Optional[float]:
+    """Seconds since the process started, None where /proc is missing."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may hold spaces, the fields after it do not
+            start = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start / os.sysconf("SC_CLK_TCK")
+
+
+class Profiler:
+    """
+    Records a tree of stages with their wall time, CPU time and the peak
+    memory of the process when they end.
+    """
+
+    def __init__(self, name: str):
+        self.root = {"name": name, "stages": []}
+        self._stack: List[dict] = [self.root]
+        self._start = self._measure()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[dict]:
+        record = {"name": name, "stages": []}
+        self._stack[-1]["stages"].append(record)
+        self._stack.append(record)
+        start = self._measure()
+        try:
+            yield record
+        finally:
+            self._stack.pop()
+            self._close(record, start)
+
+    def attach(self, record: dict):
+        """Adds a stage recorded by another profiler, e.g. in a worker process."""
+        self._stack[-1]["stages"].append(record)
+
+    def report(self) -> dict:
+        """Closes the root stage and returns the whole tree."""
+        self._close(self.root, self._start)
+        return self.root
+
+    @staticmethod
+    def _measure():
+        return time.perf_counter(), time.process_time(), peak_rss()
+
+    def _close(self, record: dict, start):
+        wall, cpu, rss = start
+        end_wall, end_cpu, end_rss = self._measure()
+        record["wall"] = end_wall - wall
+        record["cpu"] = end_cpu - cpu
+        record["peak_rss"] = end_rss
+        record["rss_growth"] = None if rss is None else end_rss - rss
@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+from typing import Dict, Union
+
+from snips_nlu import SnipsNLUEngine
+from snips_nlu.constants import BUILTIN_ENTITY_PARSER, RESOURCES
+from snips_nlu.entity_parser import BuiltinEntityParser
+from snips_nlu.resources import load_resources_from_dir
+from src.cache import digest
+from src.large_entities import large_entity_parser
+from src.packed import PACKED_DIR, is_packed, load_packed, load_packed_resources
+
+
+class ResourceManager:
+    """
+    Loads the language resources (gazetteers, word clusters, stems...) and
+    the builtin entity parsers once, and hands them to every engine that
+    persisted the same ones.
+    """
+
+    def __init__(self):
+        self._resources: Dict[str, dict] = {}
+        self._builtin_parsers: Dict[str, BuiltinEntityParser] = {}
+
+    def shared(self, path: Union[str, Path]) -> dict:
+        """
+        Shared units to load the engine at ``path`` with, as in
+        ``SnipsNLUEngine.from_path(path, **shared)`` or ``load_packed``.
+        """
+        path = Path(path)
+        packed = is_packed(path)
+        with (path / "nlu_engine.json").open(encoding="utf8") as f:
+            model = json.load(f)
+
+        shared = {}
+        metadata = model["dataset_metadata"]
+        resources_dir = (
+            path / "resources" / metadata["language_code"] if metadata else None
+        )
+        if resources_dir is not None and resources_dir.is_dir():
+            # The metadata lists the resources an engine persisted
+            key = digest(packed, _read(resources_dir / "metadata.json"))
+            if key not in self._resources:
+                load = load_packed_resources if packed else load_resources_from_dir
+                self._resources[key] = load(resources_dir)
+            shared[RESOURCES] = self._resources[key]
+
+        if model["builtin_entity_parser"]:
+            parser_dir = path / model["builtin_entity_parser"]
+            gazetteers = parser_dir / "gazetteer_entity_parser" / "metadata.json"
+            key = digest(
+                _read(parser_dir / "metadata.json"),
+                _read(gazetteers) if gazetteers.exists() else None,
+            )
+            if key not in self._builtin_parsers:
+                self._builtin_parsers[key] = BuiltinEntityParser.from_path(parser_dir)
+            shared[BUILTIN_ENTITY_PARSER] = self._builtin_parsers[key]
+        return shared
+
+
+def _read(path: Path) -> str:
+    with path.open(encoding="utf8") as f:
+        return f.read()
+
+
+resource_manager = ResourceManager()
+
+
+def load_engine(path: Union[str, Path], packed: bool = True) -> SnipsNLUEngine:
+    """
+    Loads the engine persisted at ``path``, from its packed copy when it has
+    one, unless ``packed`` is False.
+    """
+    packed_path = Path(path) / PACKED_DIR
+    if packed and is_packed(packed_path):
+        shared = resource_manager.shared(packed_path)
+        return load_packed(packed_path, **shared, **large_entity_parser(packed_path))
+    shared = resource_manager.shared(path)
+    return SnipsNLUEngine.from_path(path, **shared, **large_entity_parser(path))
@@ -0,0 +1,120 @@
+import asyncio
+import hmac
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import PlainTextResponse
+from typing_extensions import Annotated
+
+from src.config import api
+from src.live_profiler import CallProfile, StackSampler, armed, busy
+from src.memory import report
+from src.models import (
+    ErrorResponse,
+    MemoryReport,
+    ProfiledFunction,
+    ProfilerBusy,
+    Unauthorized,
+)
+from src.timing import TimedRoute, in_threadpool
+from src.utils import get_kit
+
+
+def require_admin(authorization: Annotated[Optional[str], Header()] = None):
+    token = api["ADMIN_TOKEN"]
+    scheme, _, given = (authorization or "").partition(" ")
+    if (
+        not token
+        or scheme.lower() != "bearer"
+        or not hmac.compare_digest(given.encode(), token.encode())
+    ):
+        raise Unauthorized()
+
+
+admin_router = APIRouter(route_class=TimedRoute, dependencies=[Depends(require_admin)])
+
+ERRORS = {
+    401: {"description": "Missing or wrong admin token", "model": ErrorResponse},
+    409: {"description": "Another profile is running", "model": ErrorResponse},
+}
+
+
+@admin_router.post(
+    "/profile",
+    name="Sample the stacks of the server",
+    status_code=200,
+    description="Samples the stacks of every thread of the server process for the given seconds, while it keeps answering requests, and returns them in the collapsed format of flamegraph.pl",
+    response_class=PlainTextResponse,
+    responses={
+        200: {"content": {"text/plain": {}}, "description": "The collapsed stacks"},
+        **ERRORS,
+    },
+)
+async def admin_profile(
+    seconds: Annotated[float, Query(gt=0, le=300)] = 10,
+    interval_ms: Annotated[float, Query(ge=1, le=1000)] = 5,
+) -> PlainTextResponse:
+    if not busy.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        sampler = StackSampler(interval_ms / 1000)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+    finally:
+        busy.release()
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={"Content-Disposition": 'attachment; filename="avi-nlu.collapsed"'},
+    )
+
+
+@admin_router.post(
+    "/profile/calls",
+    name="Profile the next calls of a function",
+    status_code=200,
+    description="Runs the next calls of IntentKit.parse or of the AI fallback under cProfile, and returns their stats sorted by cumulative time once they are done or the timeout passes",
+    response_class=PlainTextResponse,
+    responses={
+        200: {"content": {"text/plain": {}}, "description": "The cProfile stats"},
+        **ERRORS,
+    },
+)
+async def admin_profile_calls(
+    function: ProfiledFunction = ProfiledFunction.PARSE,
+    calls: Annotated[int, Query(ge=1, le=10_000)] = 10,
+    timeout: Annotated[float, Query(gt=0, le=600)] = 60,
+    limit: Annotated[int, Query(ge=1)] = 50,
+) -> PlainTextResponse:
+    if not busy.acquire(blocking=False):
+        raise ProfilerBusy()
+    capture = armed[function.value] = CallProfile(calls)
+    try:
+        deadline = time.monotonic() + timeout
+        while not capture.done.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+    finally:
+        armed.pop(function.value, None)
+        busy.release()
+    # Waits for a profiled call still running, off the event loop
+    stats = await in_threadpool(capture.stats, limit)
+    profiled = calls - capture.remaining
+    return PlainTextResponse(f"{profiled} of {calls} calls profiled\n{stats}")
+
+
+@admin_router.get(
+    "/memory",
+    name="Memory report",
+    status_code=200,
+    description="Reports the memory of the engine by component, of the caches and of the server processes, with the RSS before and after the engine was loaded",
+    responses={
+        200: {"model": MemoryReport, "description": "The memory report"},
+        401: ERRORS[401],
+    },
+)
+def admin_memory(request: Request, intentKit=Depends(get_kit)) -> MemoryReport:
+    master = getattr(request.app.state, "master", None)
+    return MemoryReport(**report(intentKit, master))
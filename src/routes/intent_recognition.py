@@ -3,14 +3,22 @@ from snips_nlu.exceptions import (
     SnipsNLUError,
 )
 from typing_extensions import Annotated
-from fastapi import APIRouter, Depends, Query
-from src.utils import get_kit
-from src.config import engine_base_path
+from fastapi import APIRouter, Depends, Query, Request, WebSocket
+from src.utils import get_kit, single_worker
+from src.channel import DeviceChannel
+from src.config import api
+from src.serialization import FastJSONResponse
+from src.timing import TimedRoute, in_threadpool
+from src.ingest import DatasetBuilder, NDJSON
+from src.engines import installed_engines
+from src.features import token_features
 from snips_nlu.dataset import Dataset, Intent
 from snips_nlu.dataset.entity import Entity
 from src.models import (
+    CacheStats,
     Created,
     Data,
+    DataPatch,
     EngineNotTrained,
     EngineTrain,
     EngineTrainError,
@@ -18,14 +26,18 @@ from src.models import (
     Installed,
     EngineTrainType,
     IntentError,
+    Lang,
+    NoUpload,
+    Patched,
+    PopulateProgress,
     Recognized,
+    RecognizedBatch,
+    Utterances,
     WrongDataset,
     WrongLanguage,
 )
-import os
-import json
 
-intent_router = APIRouter()
+intent_router = APIRouter(route_class=TimedRoute)
 
 
 @intent_router.get(
@@ -35,36 +47,53 @@ intent_router = APIRouter()
     responses={200: {"model": Installed, "description": "The avaliable engines"}},
 )
 async def intent_installed() -> Installed:
-    return Installed(
-        installed=list(
-            filter(
-                lambda e: os.path.isdir(f"{engine_base_path}/{e}"),
-                os.listdir(engine_base_path),
-            )
-        ),
-        data={
-            lang: json.load(open(f"{engine_base_path}/{lang}/nlu_engine.json", "r"))[
-                "dataset_metadata"
-            ]
-            for lang in os.listdir(engine_base_path)
-            if os.path.isdir(f"{engine_base_path}/{lang}")
-        },
-    )
+    engines = installed_engines.installed()
+    return Installed(installed=list(engines), data=engines)
+
+
+@intent_router.get(
+    "/cache/features",
+    name="Usage of the token feature cache",
+    status_code=200,
+    responses={200: {"model": CacheStats, "description": "The cache usage"}},
+)
+async def intent_feature_cache() -> CacheStats:
+    return CacheStats(**token_features.stats())
+
+
+@intent_router.get(
+    "/cache/entities",
+    name="Usage of the builtin entity parse cache",
+    status_code=200,
+    responses={
+        200: {"model": CacheStats, "description": "The cache usage"},
+        500: {"description": "Engine not trained", "model": ErrorResponse},
+    },
+)
+async def intent_entity_cache(intentKit=Depends(get_kit)) -> CacheStats:
+    if intentKit.entity_cache is None:
+        raise EngineNotTrained()
+    return CacheStats(**intentKit.entity_cache.stats())
 
 
 @intent_router.post(
     "/engine",
     name="Train or Reuse the Intent Recognition Engine",
     status_code=200,
+    dependencies=[Depends(single_worker)],
     responses={
         200: {"model": EngineTrain, "description": "The result"},
         500: {
             "description": "Error Training or reusing the model",
             "model": ErrorResponse,
         },
+        409: {
+            "description": "The server runs forked workers",
+            "model": ErrorResponse,
+        },
     },
 )
-async def intent_train(
+def intent_train(
     type: EngineTrainType = EngineTrainType.REUSE,
     intentKit=Depends(get_kit),
 ) -> EngineTrain:
@@ -73,7 +102,9 @@ async def intent_train(
             intentKit.reuse()
         else:
             intentKit.train()
-        return EngineTrain(result=True, action=type, lang=intentKit.lang)
+        return EngineTrain(
+            result=True, action=type, lang=intentKit.lang, profile=intentKit.profile
+        )
     except Exception as e:
         raise EngineTrainError(type, str(e))
 
@@ -100,6 +131,7 @@ def convert(d: Data) -> Dataset:
     name="Define the intent and entities",
     description="Set the current lang dataset",
     status_code=202,
+    dependencies=[Depends(single_worker)],
     responses={
         202: {"model": Created, "description": ""},
         500: {
@@ -107,7 +139,7 @@ def convert(d: Data) -> Dataset:
             "model": ErrorResponse,
         },
         409: {
-            "description": "Worng language on the dataset",
+            "description": "Worng language on the dataset, or the server runs forked workers",
             "model": ErrorResponse,
         },
         400: {
@@ -116,7 +148,7 @@ def convert(d: Data) -> Dataset:
         },
     },
 )
-async def intent_populate(dataset: Data, intentKit=Depends(get_kit)) -> Created:
+def intent_populate(dataset: Data, intentKit=Depends(get_kit)) -> Created:
     try:
         if dataset.language != intentKit.lang:
             raise WrongLanguage(intentKit.lang)
@@ -129,6 +161,111 @@ async def intent_populate(dataset: Data, intentKit=Depends(get_kit)) -> Created:
         raise EngineNotTrained()
 
 
+@intent_router.patch(
+    "/populate",
+    name="Add, update or remove intents and entities",
+    description="Apply a diff on the current lang dataset and refit only the parts of the engine it affects",
+    status_code=200,
+    dependencies=[Depends(single_worker)],
+    responses={
+        200: {"model": Patched, "description": "The retrained intents"},
+        500: {
+            "description": "Error retraining the model",
+            "model": ErrorResponse,
+        },
+        409: {
+            "description": "Worng language on the dataset, or the server runs forked workers",
+            "model": ErrorResponse,
+        },
+        400: {
+            "description": "Dataset has invalid data",
+            "model": ErrorResponse,
+        },
+    },
+)
+def intent_patch(patch: DataPatch, intentKit=Depends(get_kit)) -> Patched:
+    if patch.language != intentKit.lang:
+        raise WrongLanguage(intentKit.lang)
+    if intentKit.data is None:
+        raise WrongDataset("Please populate the data first")
+
+    try:
+        builder = DatasetBuilder(patch.language)
+        for item in patch.upsert:
+            builder.add_item(item)
+        retrained = intentKit.patch(
+            builder.intents,
+            builder.entities,
+            [r.name for r in patch.remove if r.type == "intent"],
+            [r.name for r in patch.remove if r.type == "entity"],
+        )
+    except DatasetFormatError as e:
+        raise WrongDataset(str(e))
+
+    try:
+        intentKit.train(retrained)
+        return Patched(result=True, lang=intentKit.lang, retrained=sorted(retrained))
+    except Exception as e:
+        raise EngineTrainError(EngineTrainType.TRAIN, str(e))
+
+
+@intent_router.post(
+    "/populate/stream",
+    name="Stream the intent and entities",
+    description="Set the current lang dataset from a NDJSON or multi-document YAML body, converting each intent and entity as it arrives",
+    status_code=202,
+    dependencies=[Depends(single_worker)],
+    responses={
+        202: {"model": PopulateProgress, "description": "The upload summary"},
+        409: {
+            "description": "Worng language on the dataset, or the server runs forked workers",
+            "model": ErrorResponse,
+        },
+        400: {
+            "description": "Dataset has invalid data",
+            "model": ErrorResponse,
+        },
+        415: {
+            "description": "The body is not NDJSON or YAML",
+            "model": ErrorResponse,
+        },
+    },
+)
+async def intent_populate_stream(
+    request: Request, language: Lang, intentKit=Depends(get_kit)
+) -> PopulateProgress:
+    if language != intentKit.lang:
+        raise WrongLanguage(intentKit.lang)
+
+    media_type = request.headers.get("content-type", NDJSON)
+    builder = DatasetBuilder(language)
+    intentKit.ingest = builder.progress
+    try:
+        await builder.consume(request.stream(), media_type.split(";")[0].strip())
+        await in_threadpool(intentKit.populate, builder.build())
+        return builder.progress
+    except DatasetFormatError as e:
+        raise WrongDataset(str(e))
+    finally:
+        if builder.progress.state != "done":
+            builder.progress.state = "failed"
+
+
+@intent_router.get(
+    "/populate/progress",
+    name="Progress of the last streamed dataset",
+    status_code=200,
+    responses={
+        200: {"model": PopulateProgress, "description": "The upload progress"},
+        404: {"description": "No dataset was streamed", "model": ErrorResponse},
+    },
+)
+async def intent_populate_progress(intentKit=Depends(get_kit)) -> PopulateProgress:
+    if intentKit.ingest is None:
+        raise NoUpload()
+    return intentKit.ingest
+
+
 @intent_router.get(
     "/",
     name="Recognize intent from sentence",
@@ -146,14 +283,76 @@ async def intent_populate(dataset: Data, intentKit=Depends(get_kit)) -> Created:
         },
     },
 )
-async def intent_reconize(
+def intent_reconize(
     text: Annotated[str, Query(max_length=250, min_length=2)],
     intentKit=Depends(get_kit),
 ) -> Recognized:
     try:
         data, processor = intentKit.parse(text)
-        return Recognized(result=data, processor=processor)
+        if api["VALIDATE_RESPONSES"]:
+            return Recognized(result=data, processor=processor)
+        return FastJSONResponse({"result": data, "processor": processor.value})
+    except AttributeError:
+        raise EngineNotTrained()
+    except SnipsNLUError as e:
+        raise IntentError(str(e))
+
+
+@intent_router.post(
+    "/batch",
+    name="Recognize intents from many sentences",
+    status_code=200,
+    description="Recognizes the intents of all the given sentences, classifying them together, and returns the results in the same order",
+    responses={
+        200: {"model": RecognizedBatch, "description": "The recognized intents"},
+        500: {
+            "description": "Engine not trained",
+            "model": ErrorResponse,
+        },
+        502: {
+            "description": "Error getting the intent",
+            "model": ErrorResponse,
+        },
+    },
+)
+def intent_reconize_batch(
+    utterances: Utterances,
+    intentKit=Depends(get_kit),
+) -> RecognizedBatch:
+    try:
+        results = intentKit.parse_batch(utterances.texts)
+        if api["VALIDATE_RESPONSES"]:
+            return RecognizedBatch(
+                results=[
+                    Recognized(result=data, processor=processor)
+                    for data, processor in results
+                ]
+            )
+        return FastJSONResponse(
+            {
+                "results": [
+                    {"result": data, "processor": processor.value}
+                    for data, processor in results
+                ]
+            }
+        )
     except AttributeError:
         raise EngineNotTrained()
     except SnipsNLUError as e:
         raise IntentError(str(e))
+
+
+@intent_router.websocket("/channel", name="Recognize intents on a device channel")
+async def intent_channel(
+    websocket: WebSocket,
+    ordered: bool = False,
+    window: Annotated[int, Query(ge=1, le=64)] = 8,
+):
+    """
+    Keeps a connection open per device. The device sends
+    ``{"id": ..., "text": ...}`` messages and receives
+    ``{"id": ..., "result": ..., "processor": ...}`` for each of them.
+    With ``"partial": true``, texts are partial transcripts of an utterance.
+    """
+    kit = websocket.app.state.intentKit
+    await DeviceChannel(websocket, kit, ordered, window).run()
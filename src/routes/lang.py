@@ -4,7 +4,10 @@ import lingua_franca
 import lingua_franca.parse
 import lingua_franca.format
 
-lang_router = APIRouter()
+from src.metrics import lingua_franca_duration, timed
+from src.timing import TimedRoute
+
+lang_router = APIRouter(route_class=TimedRoute)
 
 
 @lang_router.get("/")
@@ -13,6 +16,7 @@ async def lang_base():
 
 
 @lang_router.get("/parse/extract_numbers")
+@timed(lingua_franca_duration)
 def extract_numbers(
     text: str, short_scale: bool = True, ordinals: bool = False, lang: str = ""
 ):
@@ -39,6 +43,7 @@ def extract_numbers(
 
 
 @lang_router.get("/parse/extract_number")
+@timed(lingua_franca_duration)
 def extract_number(text, short_scale=True, ordinals=False, lang=""):
     """Takes in a string and extracts a number.
 
@@ -63,6 +68,7 @@ def extract_number(text, short_scale=True, ordinals=False, lang=""):
 
 
 @lang_router.get("/parse/extract_duration")
+@timed(lingua_franca_duration)
 def extract_duration(text, lang=""):
     """Convert an english phrase into a number of seconds
 
@@ -96,6 +102,7 @@ def extract_duration(text, lang=""):
 
 
 @lang_router.get("/parse/extract_datetime")
+@timed(lingua_franca_duration)
 def extract_datetime(text, lang=""):
     """
     Extracts date and time information from a sentence.  Parses many of the
@@ -150,6 +157,7 @@ def extract_datetime(text, lang=""):
 
 
 @lang_router.get("/parse/normalize")
+@timed(lingua_franca_duration)
 def normalize(text, lang="", remove_articles=True):
     """Prepare a string for parsing
 
@@ -170,6 +178,7 @@ def normalize(text, lang="", remove_articles=True):
 
 
 @lang_router.get("/parse/is_fractional")
+@timed(lingua_franca_duration)
 def is_fractional(input_str, short_scale=True, lang=""):
     """
     This function takes the given text and checks if it is a fraction.
@@ -190,6 +199,7 @@ def is_fractional(input_str, short_scale=True, lang=""):
 
 
 @lang_router.get("/format/nice_number")
+@timed(lingua_franca_duration)
 def nice_number(number, lang="", speech=True, denominators=[]):
     """Format a float to human readable functions
 
@@ -212,6 +222,7 @@ def nice_number(number, lang="", speech=True, denominators=[]):
 
 
 @lang_router.get("/format/nice_time")
+@timed(lingua_franca_duration)
 def nice_time(dt=None, lang="", speech=True, use_24hour=False, use_ampm=False):
     """
     Format a time to a comfortable human format
@@ -240,6 +251,7 @@ def nice_time(dt=None, lang="", speech=True, use_24hour=False, use_ampm=False):
 
 
 @lang_router.get("/format/pronounce_number")
+@timed(lingua_franca_duration)
 def pronounce_number(number: int, lang="", places=2):
     """
     Convert a number to it's spoken equivalent
@@ -258,6 +270,7 @@ def pronounce_number(number: int, lang="", places=2):
 
 
 @lang_router.get("/format/nice_duration")
+@timed(lingua_franca_duration)
 def nice_duration(duration: int, lang="", speech=True):
     """Convert duration in seconds to a nice spoken timespan
 
@@ -278,6 +291,7 @@ def nice_duration(duration: int, lang="", speech=True):
 
 
 @lang_router.get("/format/nice_relative_time")
+@timed(lingua_franca_duration)
 def nice_relative_time(when, relative_to=None, lang=None):
     """Create a relative phrase to roughly describe the period between two
     datetimes.
@@ -0,0 +1,42 @@
+import json
+
+from fastapi.responses import Response
+
+from src.metrics import serialization_duration
+from src.timing import stage
+
+try:
+    import orjson
+except ImportError:  # The standard encoder, slower but enough
+    orjson = None
+
+
+def _default(value):
+    # numpy scalars, like the probabilities of the classifiers
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """``content`` as compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(
+            content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY
+        )
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response of content already in the shape of the response model,
+    like the engine results, which is encoded without validating it again.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        with serialization_duration.time(), stage("serialization"):
+            return dumps(content)
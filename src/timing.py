@@ -0,0 +1,117 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+
+class Timings:
+    """Seconds spent in every stage of a request, in the order they started."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def header(self) -> str:
+        """The stages and the total in the ``Server-Timing`` format, in ms."""
+        stages = [*self.stages.items(), ("total", self.total())]
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            **{name: seconds * 1000 for name, seconds in self.stages.items()},
+            "total": self.total() * 1000,
+        }
+
+
+# Timings of the request being answered, None when they are not recorded
+current: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+
+
+class stage:
+    """Adds the time of the block to a stage of the current request, if any."""
+
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = current.get()
+        if self.timings is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timings is not None:
+            self.timings.add(self.name, time.perf_counter() - self.start)
+
+
+def timed_stage(name: str, function: Callable) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+async def in_threadpool(function: Callable, *args, **kwargs):
+    """
+    Runs a blocking call in the threadpool, adding the time it waited for a
+    thread to the queue stage of the current request.
+    """
+    timings = current.get()
+    if timings is None:
+        return await run_in_threadpool(function, *args, **kwargs)
+    queued = time.perf_counter()
+
+    def run():
+        timings.add("queue", time.perf_counter() - queued)
+        return function(*args, **kwargs)
+
+    return await run_in_threadpool(run)
+
+
+def _timed_endpoint(call: Callable) -> Callable:
+    """
+    Records the time from the start of the request to the endpoint as the
+    validation of its body and dependencies, and for endpoints run in the
+    threadpool, the time they waited for a thread as queueing.
+    """
+    if asyncio.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            timings = current.get()
+            if timings is not None:
+                timings.add("validation", timings.total())
+            return await call(*args, **kwargs)
+
+        return endpoint
+
+    @functools.wraps(call)
+    async def threaded(*args, **kwargs):
+        timings = current.get()
+        if timings is not None:
+            timings.add("validation", timings.total())
+        return await in_threadpool(call, *args, **kwargs)
+
+    return threaded
+
+
+class TimedRoute(APIRoute):
+    """A route whose validation and queueing go to the request timings."""
+
+    def get_route_handler(self):
+        self.dependant.call = _timed_endpoint(self.dependant.call)
+        return super().get_route_handler()
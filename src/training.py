@@ -0,0 +1,527 @@
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterable, List, Optional, Tuple
+
+from snips_nlu import SnipsNLUEngine
+from snips_nlu.common.dataset_utils import get_slot_name_mapping
+from snips_nlu.constants import DATA, ENTITIES, INTENTS, LANGUAGE, METADATA
+from snips_nlu.data_augmentation import augment_utterances
+from snips_nlu.dataset import Dataset, validate_and_format_dataset
+from snips_nlu.entity_parser import BuiltinEntityParser
+from snips_nlu.exceptions import _EmptyDatasetUtterancesError
+from snips_nlu.intent_classifier import IntentClassifier, LogRegIntentClassifier
+from snips_nlu.intent_classifier.featurizer import Featurizer
+from snips_nlu.intent_classifier.log_reg_classifier import LOG_REG_ARGS
+from snips_nlu.intent_classifier.log_reg_classifier_utils import (
+    build_training_data,
+    get_regularization_factor,
+)
+from snips_nlu.intent_parser import IntentParser, ProbabilisticIntentParser
+from snips_nlu.nlu_engine.nlu_engine import _get_dataset_metadata
+from snips_nlu.resources import load_resources_from_dir, persist_resources
+from snips_nlu.slot_filler import CRFSlotFiller, SlotFiller
+from snips_nlu.slot_filler.crf_slot_filler import (
+    _encode_tag,
+    _ensure_safe,
+    _get_crf_model,
+)
+from snips_nlu.slot_filler.crf_utils import TAGS, TOKENS, utterance_to_sample
+
+from src.cache import CachedEntityParser, TrainingCache, digest, state_digest
+from src.config import training
+from src.large_entities import fit_custom_entity_parser, load_custom_entity_parser
+from src.packed import own_crf_model
+from src.profiler import Profiler
+
+
+def fit_engine(
+    engine: SnipsNLUEngine,
+    data: Dataset,
+    intents: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    profiler: Optional[Profiler] = None,
+    cache: Optional[TrainingCache] = None,
+) -> SnipsNLUEngine:
+    """
+    Fits the engine the same way SnipsNLUEngine.fit does.
+
+    When the engine is already fitted and ``intents`` is given, only the slot
+    fillers of those intents are refitted. The entity parsers, the lookup
+    parser and the intent classifier depend on the whole dataset and are
+    always refitted.
+
+    With more than one worker the slot fillers are fitted in a process pool.
+    Every unit is seeded from ``seed`` and its own name, so the engine is the
+    same whatever the number of workers. Both default to the training config
+    at the time of the call.
+
+    The time and memory spent on every unit are recorded on ``profiler``.
+    Data augmentation, entity matching and CRF features are reused from
+    ``cache`` when their inputs did not change since a previous fit.
+    """
+    workers = training["WORKERS"] if workers is None else workers
+    seed = training["SEED"] if seed is None else seed
+    profiler = profiler or Profiler("train")
+    cache = cache or TrainingCache(training["CACHE_PATH"], training["CACHE_SIZE"])
+    try:
+        dataset = validate_and_format_dataset(data)
+        partial = intents is not None and engine.fitted
+        retrain = set(intents) if partial else set(dataset[INTENTS])
+
+        with profiler.stage("resources"):
+            if engine.resources is None:
+                engine.load_resources_if_needed(dataset[LANGUAGE])
+        with profiler.stage("builtin_entity_parser"):
+            engine.fit_builtin_entity_parser_if_needed(dataset)
+        with profiler.stage("custom_entity_parser"):
+            fit_custom_entity_parser(engine, dataset)
+
+        parsers = []
+        for parser_config in engine.config.intent_parsers_configs:
+            parser = None
+            if partial:
+                parser = next(
+                    (
+                        p
+                        for p in engine.intent_parsers
+                        if isinstance(p, ProbabilisticIntentParser)
+                        and p.unit_name == parser_config.unit_name
+                    ),
+                    None,
+                )
+            if parser is None:
+                parser = IntentParser.from_config(parser_config, **shared_with(engine))
+
+            with profiler.stage(parser_config.unit_name):
+                if isinstance(parser, ProbabilisticIntentParser):
+                    share_entity_parsers(parser, engine)
+                    for slot_filler in parser.slot_fillers.values():
+                        own_crf_model(slot_filler)
+                    _fit_probabilistic_parser(
+                        parser, dataset, retrain, workers, seed, profiler, cache
+                    )
+                else:
+                    parser.fit(dataset)
+            parsers.append(parser)
+
+        engine.intent_parsers = parsers
+        engine.dataset_metadata = _get_dataset_metadata(dataset)
+    finally:
+        cache.close()
+    return engine
+
+
+def shared_with(unit) -> dict:
+    """The shared resources a unit hands down to the units it creates."""
+    return {
+        "builtin_entity_parser": unit.builtin_entity_parser,
+        "custom_entity_parser": unit.custom_entity_parser,
+        "resources": unit.resources,
+        "random_state": unit.random_state,
+    }
+
+
+def share_entity_parsers(parser: ProbabilisticIntentParser, engine: SnipsNLUEngine):
+    """Points a fitted parser and its slot fillers to the engine resources."""
+    units = [parser, parser.intent_classifier, *parser.slot_fillers.values()]
+    for unit in filter(None, units):
+        unit.builtin_entity_parser = engine.builtin_entity_parser
+        unit.custom_entity_parser = engine.custom_entity_parser
+        unit.resources = engine.resources
+        for factory in getattr(unit, "features_factories", []):
+            factory.builtin_entity_parser = engine.builtin_entity_parser
+            factory.custom_entity_parser = engine.custom_entity_parser
+            factory.resources = engine.resources
+
+
+def unit_seed(seed: int, name: str) -> int:
+    """A seed of its own for the unit fitted on ``name``."""
+    return (seed + zlib.crc32(name.encode("utf8"))) % 2**32
+
+
+def _fit_probabilistic_parser(
+    parser: ProbabilisticIntentParser,
+    dataset: dict,
+    retrain: set,
+    workers: int,
+    seed: int,
+    profiler: Profiler,
+    cache: TrainingCache,
+):
+    parser.intent_classifier = IntentClassifier.from_config(
+        parser.config.intent_classifier_config,
+        **dict(shared_with(parser), random_state=seed),
+    )
+    with profiler.stage("intent_classifier"):
+        fit_intent_classifier(parser.intent_classifier, dataset, profiler, cache)
+    cache.flush()
+
+    parser.slot_fillers = {
+        intent: slot_filler
+        for intent, slot_filler in parser.slot_fillers.items()
+        if intent in dataset[INTENTS] and intent not in retrain
+    }
+    missing = [i for i in dataset[INTENTS] if i not in parser.slot_fillers]
+    with profiler.stage("slot_fillers"):
+        if workers > 1 and len(missing) > 1:
+            fitted = _fit_slot_fillers_in_pool(
+                parser, dataset, missing, workers, seed, profiler, cache
+            )
+        else:
+            config = parser.config.slot_filler_config
+            shared = shared_with(parser)
+            fitted = {}
+            for intent in missing:
+                with profiler.stage(intent):
+                    fitted[intent] = _fit_slot_filler(
+                        config, shared, dataset, intent, seed, profiler, cache
+                    )
+                cache.flush()
+    for intent in dataset[INTENTS]:
+        if intent in fitted:
+            parser.slot_fillers[intent] = fitted[intent]
+
+
+def _fit_slot_filler(
+    config,
+    shared: dict,
+    dataset: dict,
+    intent: str,
+    seed: int,
+    profiler: Profiler,
+    cache: TrainingCache,
+):
+    # The slot filler config is mutated when fitted, so each gets a copy
+    slot_filler = SlotFiller.from_config(
+        deepcopy(config), **dict(shared, random_state=unit_seed(seed, intent))
+    )
+    if isinstance(slot_filler, CRFSlotFiller):
+        return fit_crf_slot_filler(slot_filler, dataset, intent, profiler, cache)
+    return slot_filler.fit(dataset, intent)
+
+
+def fit_intent_classifier(
+    classifier: IntentClassifier,
+    dataset: dict,
+    profiler: Profiler,
+    cache: TrainingCache,
+) -> IntentClassifier:
+    """
+    LogRegIntentClassifier.fit, split into profiled stages.
+    The augmented data and the entity parses are taken from the cache.
+    """
+    if not isinstance(classifier, LogRegIntentClassifier):
+        return classifier.fit(dataset)
+
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.utils import compute_class_weight
+
+    classifier.load_resources_if_needed(dataset[LANGUAGE])
+    classifier.fit_builtin_entity_parser_if_needed(dataset)
+    classifier.fit_custom_entity_parser_if_needed(dataset)
+    language = dataset[LANGUAGE]
+
+    with profiler.stage("augmentation"):
+        key = digest(
+            "intent_classifier",
+            cache.digest_of(dataset),
+            classifier.config.data_augmentation_config.to_dict(),
+            _resources_digest(classifier.resources),
+            state_digest(classifier.random_state),
+        )
+        augmented = cache.get(key)
+        if augmented is None:
+            augmented = build_training_data(
+                dataset,
+                language,
+                classifier.config.data_augmentation_config,
+                classifier.resources,
+                classifier.random_state,
+            ) + (classifier.random_state.get_state(),)
+            cache.put(key, augmented)
+        utterances, classes, intent_list, state = augmented
+        classifier.random_state.set_state(state)
+    classifier.intent_list = intent_list
+    if len(intent_list) <= 1:
+        return classifier
+
+    entities = cache.digest_of(dataset[ENTITIES])
+    classifier.featurizer = Featurizer(
+        config=classifier.config.featurizer_config,
+        builtin_entity_parser=CachedEntityParser(
+            classifier.builtin_entity_parser,
+            cache,
+            digest("builtin", language, entities),
+        ),
+        custom_entity_parser=CachedEntityParser(
+            classifier.custom_entity_parser,
+            cache,
+            digest("custom", entities, _resources_digest(classifier.resources)),
+        ),
+        resources=classifier.resources,
+        random_state=classifier.random_state,
+    )
+    classifier.featurizer.language = language
+
+    none_class = max(classes)
+    with profiler.stage("featurization"):
+        try:
+            x = classifier.featurizer.fit_transform(
+                dataset, utterances, classes, none_class
+            )
+        except _EmptyDatasetUtterancesError:
+            classifier.featurizer = None
+            return classifier
+        finally:
+            _uncache_entity_parsers(classifier)
+
+    with profiler.stage("fit"):
+        class_weights = compute_class_weight("balanced", range(none_class + 1), classes)
+        class_weights[-1] *= classifier.config.noise_reweight_factor
+        classifier.classifier = SGDClassifier(
+            random_state=classifier.random_state,
+            alpha=get_regularization_factor(dataset),
+            class_weight=dict(enumerate(class_weights)),
+            **LOG_REG_ARGS,
+        )
+        classifier.classifier.fit(x, classes)
+    return classifier
+
+
+def fit_crf_slot_filler(
+    slot_filler: CRFSlotFiller,
+    dataset: dict,
+    intent: str,
+    profiler: Profiler,
+    cache: TrainingCache,
+) -> CRFSlotFiller:
+    """
+    CRFSlotFiller.fit, split into profiled stages.
+    The augmented data and the features of each utterance are taken from
+    the cache.
+    """
+    slot_filler.load_resources_if_needed(dataset[LANGUAGE])
+    slot_filler.fit_builtin_entity_parser_if_needed(dataset)
+    slot_filler.fit_custom_entity_parser_if_needed(dataset)
+    for factory in slot_filler.features_factories:
+        factory.custom_entity_parser = slot_filler.custom_entity_parser
+        factory.builtin_entity_parser = slot_filler.builtin_entity_parser
+        factory.resources = slot_filler.resources
+
+    slot_filler.language = dataset[LANGUAGE]
+    slot_filler.intent = intent
+    slot_filler.slot_name_mapping = get_slot_name_mapping(dataset, intent)
+    if not slot_filler.slot_name_mapping:
+        # No need to train the CRF if the intent has no slots
+        return slot_filler
+
+    resources = _resources_digest(slot_filler.resources)
+    with profiler.stage("augmentation"):
+        key = digest(
+            "slot_filler",
+            slot_filler.language,
+            intent,
+            dataset[INTENTS][intent],
+            {
+                e: dataset[ENTITIES].get(e)
+                for e in slot_filler.slot_name_mapping.values()
+            },
+            slot_filler.config.data_augmentation_config.to_dict(),
+            slot_filler.config.tagging_scheme,
+            resources,
+            state_digest(slot_filler.random_state),
+        )
+        augmented = cache.get(key)
+        if augmented is None:
+            utterances = augment_utterances(
+                dataset,
+                intent,
+                language=slot_filler.language,
+                resources=slot_filler.resources,
+                random_state=slot_filler.random_state,
+                **slot_filler.config.data_augmentation_config.to_dict(),
+            )
+            samples = [
+                utterance_to_sample(
+                    u[DATA], slot_filler.config.tagging_scheme, slot_filler.language
+                )
+                for u in utterances
+            ]
+            augmented = samples, slot_filler.random_state.get_state()
+            cache.put(key, augmented)
+        samples, state = augmented
+        slot_filler.random_state.set_state(state)
+
+    with profiler.stage("featurization"):
+        for factory in slot_filler.features_factories:
+            factory.fit(dataset, intent)
+        namespace = digest(
+            slot_filler.language,
+            slot_filler.config.to_dict(),
+            cache.digest_of(dataset[ENTITIES]),
+            resources,
+        )
+        x = [
+            _drop_out(slot_filler, _crf_features(slot_filler, sample, cache, namespace))
+            for sample in samples
+        ]
+        y = [list(sample[TAGS]) for sample in samples]
+        # Also makes sure the OUTSIDE label is learnt
+        x, y = _ensure_safe(x, y)
+        y = [[_encode_tag(tag) for tag in tags] for tags in y]
+
+    with profiler.stage("crf"):
+        slot_filler.crf_model = _get_crf_model(slot_filler.config.crf_args)
+        slot_filler.crf_model.fit(x, y)
+    return slot_filler
+
+
+def _crf_features(
+    slot_filler: CRFSlotFiller, sample: dict, cache: TrainingCache, namespace: str
+) -> List[dict]:
+    tokens = sample[TOKENS]
+    key = digest(namespace, [(t.value, t.start, t.end) for t in tokens])
+    features = cache.get(key)
+    if features is None:
+        features = [dict(f) for f in slot_filler.compute_features(tokens)]
+        cache.put(key, features)
+    return features
+
+
+def _drop_out(slot_filler: CRFSlotFiller, features: List[dict]) -> List[dict]:
+    """
+    Applies the feature drop out of CRFSlotFiller.compute_features on
+    features computed without it, drawing the same random numbers.
+    """
+    drop_outs = [(f.name, f.drop_out) for f in slot_filler.features]
+    draws = iter(slot_filler.random_state.rand(len(features) * len(drop_outs)))
+    kept = []
+    for token_features in features:
+        kept.append(
+            {
+                name: token_features[name]
+                for name, drop_out in drop_outs
+                if next(draws) >= drop_out and name in token_features
+            }
+        )
+    return kept
+
+
+def _resources_digest(resources: Optional[dict]) -> Optional[str]:
+    return digest(resources[METADATA]) if resources else None
+
+
+def _uncache_entity_parsers(classifier: IntentClassifier):
+    """Puts the real entity parsers back once the featurizer is fitted."""
+    featurizer = classifier.featurizer
+    units = [
+        featurizer,
+        getattr(featurizer, "tfidf_vectorizer", None),
+        getattr(featurizer, "cooccurrence_vectorizer", None),
+    ]
+    for unit in filter(None, units):
+        unit.builtin_entity_parser = classifier.builtin_entity_parser
+        unit.custom_entity_parser = classifier.custom_entity_parser
+
+
+def _fit_slot_fillers_in_pool(
+    parser: ProbabilisticIntentParser,
+    dataset: dict,
+    intents: List[str],
+    workers: int,
+    seed: int,
+    profiler: Profiler,
+    cache: TrainingCache,
+) -> dict:
+    """
+    Fits the slot fillers in worker processes.
+    The workers get the parent's resources and entity parsers through a
+    temporary directory and hand back persisted slot fillers.
+    """
+    with TemporaryDirectory(prefix="avi-nlu-") as tmp:
+        workdir = Path(tmp)
+        persist_resources(
+            parser.resources,
+            workdir / "resources",
+            parser.config.get_required_resources(),
+        )
+        parser.builtin_entity_parser.persist(workdir / "builtin_entity_parser")
+        parser.custom_entity_parser.persist(workdir / "custom_entity_parser")
+
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(intents)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                str(workdir),
+                dataset,
+                parser.config.slot_filler_config.to_dict(),
+                cache.path,
+                cache.max_bytes,
+            ),
+        ) as pool:
+            results = list(
+                pool.map(
+                    _fit_in_worker,
+                    intents,
+                    [seed] * len(intents),
+                    [
+                        str(workdir / "slot_fillers" / str(n))
+                        for n in range(len(intents))
+                    ],
+                )
+            )
+
+        shared = shared_with(parser)
+        fitted = {}
+        for intent, (path, profile) in zip(intents, results):
+            profiler.attach(profile)
+            fitted[intent] = SlotFiller.load_from_path(path, **shared)
+        return fitted
+
+
+_worker: dict = {}
+
+
+def _init_worker(
+    workdir: str, dataset: dict, config: dict, cache_path: str, cache_size: int
+):
+    workdir = Path(workdir)
+    resources = None
+    if (workdir / "resources").exists():
+        resources = load_resources_from_dir(workdir / "resources")
+    _worker["dataset"] = dataset
+    _worker["cache"] = TrainingCache(cache_path, cache_size)
+    _worker["config"] = SlotFiller.get_config(config)
+    _worker["shared"] = {
+        "builtin_entity_parser": BuiltinEntityParser.from_path(
+            workdir / "builtin_entity_parser"
+        ),
+        "custom_entity_parser": load_custom_entity_parser(
+            workdir / "custom_entity_parser"
+        ),
+        "resources": resources,
+    }
+
+
+def _fit_in_worker(intent: str, seed: int, path: str) -> Tuple[str, dict]:
+    profiler = Profiler(intent)
+    slot_filler = _fit_slot_filler(
+        _worker["config"],
+        _worker["shared"],
+        _worker["dataset"],
+        intent,
+        seed,
+        profiler,
+        _worker["cache"],
+    )
+    _worker["cache"].flush()
+    profile = profiler.report()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    slot_filler.persist(Path(path))
+    return path, profile
@@ -1,6 +1,16 @@
 from fastapi import Request
 from src.kit import IntentKit
+from src.models import ForkedWorkers
 
 
 def get_kit(request: Request) -> IntentKit:
     return request.app.state.intentKit
+
+
+def single_worker(request: Request):
+    """
+    Refuses the request on forked workers, where it would only change the
+    dataset or engine of the worker that answers it.
+    """
+    if getattr(request.app.state, "master", None) is not None:
+        raise ForkedWorkers()
@@ -0,0 +1,110 @@
+from typing import Dict, List
+
+import numpy as np
+from snips_nlu.preprocessing import tokenize
+from snips_nlu.slot_filler import CRFSlotFiller
+from snips_nlu.slot_filler.crf_slot_filler import _decode_tag
+from snips_nlu.slot_filler.crf_utils import tags_to_slots
+
+
+class CRFTables:
+    """
+    Weights of a fitted CRF as arrays, to decode many sequences at once.
+    crfsuite exposes the weights rounded to 6 decimals, so paths whose scores
+    are closer than that may be decoded differently than by its tagger.
+    """
+
+    def __init__(self, crf):
+        self.labels: List[str] = list(crf.classes_)
+        index = {label: i for i, label in enumerate(self.labels)}
+        self.transitions = np.zeros((len(self.labels), len(self.labels)))
+        for (source, target), weight in crf.transition_features_.items():
+            self.transitions[index[source], index[target]] = weight
+
+        self.attributes: Dict[str, int] = {}
+        rows, columns, weights = [], [], []
+        for (attribute, label), weight in crf.state_features_.items():
+            rows.append(self.attributes.setdefault(attribute, len(self.attributes)))
+            columns.append(index[label])
+            weights.append(weight)
+        self.states = np.zeros((len(self.attributes), len(self.labels)))
+        self.states[rows, columns] = weights
+
+    def emissions(self, features: List[dict]) -> np.ndarray:
+        """State scores of each token for each label."""
+        positions, rows, values = [], [], []
+        for position, token_features in enumerate(features):
+            for attribute, value in _attributes(token_features):
+                row = self.attributes.get(attribute)
+                if row is not None:
+                    positions.append(position)
+                    rows.append(row)
+                    values.append(value)
+        scores = np.zeros((len(features), len(self.labels)))
+        rows = np.asarray(rows, dtype=np.intp)
+        weights = self.states[rows] * np.asarray(values)[:, None]
+        np.add.at(scores, np.asarray(positions, dtype=np.intp), weights)
+        return scores
+
+    def decode(self, emissions: List[np.ndarray]) -> List[List[str]]:
+        """Viterbi decoding of all the sequences together, padded to the longest."""
+        lengths = np.array([len(e) for e in emissions])
+        size, steps, labels = len(emissions), lengths.max(), len(self.labels)
+        scores = np.zeros((size, steps, labels))
+        for i, e in enumerate(emissions):
+            scores[i, : len(e)] = e
+
+        best = scores[:, 0]
+        backpointers = np.zeros((size, steps, labels), dtype=np.intp)
+        for step in range(1, steps):
+            candidates = best[:, :, None] + self.transitions
+            # argmax keeps the first of ties, like crfsuite
+            backpointers[:, step] = candidates.argmax(axis=1)
+            running = (step < lengths)[:, None]
+            best = np.where(running, candidates.max(axis=1) + scores[:, step], best)
+
+        tags = np.zeros((size, steps), dtype=np.intp)
+        current = best.argmax(axis=1)
+        rows = np.arange(size)
+        for step in range(steps - 1, -1, -1):
+            tags[:, step] = current
+            if step:
+                previous = backpointers[rows, step, current]
+                current = np.where(step < lengths, previous, current)
+        return [
+            [self.labels[t] for t in sequence[:length]]
+            for sequence, length in zip(tags, lengths)
+        ]
+
+
+def _attributes(token_features: dict):
+    # The conversion pycrfsuite applies to the items of a sequence
+    for name, value in token_features.items():
+        if isinstance(value, str):
+            yield f"{name}:{value}", 1.0
+        else:
+            yield name, float(value)
+
+
+def batch_slots(slot_filler: CRFSlotFiller, tables: CRFTables, texts: List[str]):
+    """The same slots as ``slot_filler.get_slots`` for each text."""
+    slots: List[list] = [[] for _ in texts]
+    if not slot_filler.slot_name_mapping:
+        return slots
+
+    tokens = [tokenize(text, slot_filler.language) for text in texts]
+    decoded = [i for i, t in enumerate(tokens) if t]
+    if not decoded:
+        return slots
+    tags = tables.decode(
+        [tables.emissions(slot_filler.compute_features(tokens[i])) for i in decoded]
+    )
+    for i, sequence in zip(decoded, tags):
+        slots[i] = tags_to_slots(
+            texts[i],
+            tokens[i],
+            [_decode_tag(t) for t in sequence],
+            slot_filler.config.tagging_scheme,
+            slot_filler.slot_name_mapping,
+        )
+    return slots
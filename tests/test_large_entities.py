@@ -0,0 +1,48 @@
+import pytest
+
+from src.large_entities import _matches
+from src.packed import StringTable
+
+VALUES = ["new", "new york", "new york city", "san francisco", "york"]
+
+
+@pytest.fixture(scope="module")
+def table():
+    return StringTable.build(sorted(VALUES))
+
+
+def matches(table, text):
+    words = text.split()
+    return [
+        (" ".join(words[start:end]), table[index])
+        for start, end, index in _matches(table, words)
+    ]
+
+
+def test_takes_the_longest_value(table):
+    assert matches(table, "i love new york city") == [
+        ("new york city", "new york city")
+    ]
+
+
+def test_falls_back_to_a_shorter_value(table):
+    assert matches(table, "new york state") == [("new york", "new york")]
+    assert matches(table, "new jersey") == [("new", "new")]
+
+
+def test_continues_after_a_match(table):
+    assert matches(table, "new york york new") == [
+        ("new york", "new york"),
+        ("york", "york"),
+        ("new", "new"),
+    ]
+
+
+def test_ignores_prefixes_that_are_not_values(table):
+    assert matches(table, "san diego") == []
+    assert matches(table, "to san francisco") == [("san francisco", "san francisco")]
+
+
+def test_matches_nothing(table):
+    assert matches(table, "") == []
+    assert matches(table, "nothing here") == []
@@ -0,0 +1,154 @@
+import pytest
+
+from src.lookup import TemplateIndex, normalize
+
+
+def utterance(*chunks):
+    return {
+        "data": [
+            {"text": chunk} if isinstance(chunk, str) else chunk for chunk in chunks
+        ]
+    }
+
+
+def room(text):
+    return {"text": text, "entity": "room", "slot_name": "room"}
+
+
+def color(text):
+    return {"text": text, "entity": "color", "slot_name": "color"}
+
+
+DATASET = {
+    "language": "en",
+    "intents": {
+        "turn_on": {
+            "utterances": [
+                utterance("turn on the ", room("kitchen"), " lights"),
+                utterance("lights on please"),
+                utterance("I need light"),
+            ]
+        },
+        "turn_off": {
+            "utterances": [
+                utterance("turn off the ", room("bedroom"), " lights"),
+                utterance("lights on please"),
+            ]
+        },
+        "set_color": {
+            "utterances": [
+                utterance("paint the ", room("garage"), " in ", color("red"))
+            ]
+        },
+    },
+    "entities": {
+        "room": {
+            "data": [
+                {"value": "kitchen", "synonyms": ["cooking room"]},
+                {"value": "bedroom", "synonyms": []},
+                {"value": "garage", "synonyms": []},
+            ],
+            "use_synonyms": True,
+            "automatically_extensible": False,
+            "matching_strictness": 1.0,
+        },
+        "color": {
+            "data": [{"value": "red", "synonyms": []}],
+            "use_synonyms": True,
+            "automatically_extensible": True,
+            "matching_strictness": 1.0,
+        },
+    },
+}
+
+
+@pytest.fixture(scope="module")
+def index():
+    return TemplateIndex.build(DATASET)
+
+
+def slots(result):
+    return [
+        (slot["slotName"], slot["rawValue"], slot["value"]["value"], slot["range"])
+        for slot in result["slots"]
+    ]
+
+
+def test_normalize_keeps_the_offsets():
+    normalized, offsets = normalize("Turn  ON, the Lights!")
+
+    assert normalized == "turn on the lights"
+    assert [offsets[i] for i in range(len(normalized))] == [
+        0, 1, 2, 3, 4, 6, 7, 8, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19,
+    ]  # fmt: skip
+
+
+def test_matches_a_training_utterance(index):
+    result = index.match("Turn on the kitchen lights!")
+
+    assert result["input"] == "Turn on the kitchen lights!"
+    assert result["intent"] == {"intentName": "turn_on", "probability": 1.0}
+    assert slots(result) == [
+        ("room", "kitchen", "kitchen", {"start": 12, "end": 19}),
+    ]
+
+
+def test_matches_without_slots(index):
+    result = index.match("i NEED light")
+
+    assert result["intent"]["intentName"] == "turn_on"
+    assert result["slots"] == []
+
+
+def test_matches_a_template_with_a_synonym(index):
+    result = index.match("turn on the Cooking Room lights")
+
+    assert result["intent"]["intentName"] == "turn_on"
+    assert slots(result) == [
+        ("room", "Cooking Room", "kitchen", {"start": 12, "end": 24}),
+    ]
+
+
+def test_matches_a_template_with_another_value(index):
+    result = index.match("turn off the garage lights")
+
+    assert result["intent"]["intentName"] == "turn_off"
+    assert slots(result) == [
+        ("room", "garage", "garage", {"start": 13, "end": 19}),
+    ]
+
+
+def test_keeps_values_of_extensible_entities(index):
+    result = index.match("paint the bedroom in dark blue")
+
+    assert result["intent"]["intentName"] == "set_color"
+    assert slots(result) == [
+        ("room", "bedroom", "bedroom", {"start": 10, "end": 17}),
+        ("color", "dark blue", "dark blue", {"start": 21, "end": 30}),
+    ]
+
+
+def test_leaves_unknown_values_of_closed_entities(index):
+    assert index.match("turn on the attic lights") is None
+
+
+def test_leaves_utterances_of_many_intents(index):
+    assert index.match("lights on please") is None
+
+
+def test_leaves_other_utterances(index):
+    assert index.match("what time is it") is None
+    assert index.match("turn on the kitchen lights now") is None
+
+
+def test_persists(index, tmp_path):
+    index.persist(tmp_path / "lookup.json")
+    loaded = TemplateIndex.from_path(tmp_path / "lookup.json")
+
+    for text in (
+        "turn on the kitchen lights",
+        "turn on the cooking room lights",
+        "paint the bedroom in dark blue",
+        "lights on please",
+    ):
+        assert loaded.match(text) == index.match(text)
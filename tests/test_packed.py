@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from src.packed import PackedMapping, PackedSet, StringTable
+
+STRINGS = sorted(["", "a", "ab", "abc", "b", "ção", "über", "日本"])
+
+
+@pytest.fixture(params=["built", "saved"])
+def table(request, tmp_path):
+    built = StringTable.build(STRINGS)
+    if request.param == "built":
+        return built
+    built.save(tmp_path / "table")
+    return StringTable(tmp_path / "table")
+
+
+def test_string_table_round_trip(table):
+    assert len(table) == len(STRINGS)
+    assert list(table) == STRINGS
+    assert table[-1] == STRINGS[-1]
+    assert table[1:3] == STRINGS[1:3]
+    with pytest.raises(IndexError):
+        table[len(STRINGS)]
+
+
+def test_string_table_find(table):
+    for i, value in enumerate(STRINGS):
+        assert table.find(value) == i
+    assert table.find("abcd") == -1
+    assert table.find("c") == -1
+
+
+def test_string_table_prefix_range(table):
+    assert table.prefix_range("a") == (1, 4)
+    assert table.prefix_range("ab") == (2, 4)
+    assert table.prefix_range("abcd") == (4, 4)
+    assert table.prefix_range("ç") == (5, 6)
+    # Searched within the range of a shorter prefix
+    assert table.prefix_range("ab", *table.prefix_range("a")) == (2, 4)
+
+
+def test_empty_string_table(tmp_path):
+    StringTable.write(tmp_path / "empty", [])
+    table = StringTable(tmp_path / "empty")
+
+    assert len(table) == 0
+    assert table.find("a") == -1
+
+
+@pytest.mark.parametrize(
+    "mapping",
+    [
+        {"b": "two", "a": "one", "ção": "três", "": "empty"},
+        {"b": 2, "a": 1, "ção": 3, "big": 2**40},
+    ],
+    ids=["strings", "integers"],
+)
+def test_packed_mapping_round_trip(mapping, tmp_path):
+    PackedMapping.write(tmp_path / "mapping", mapping)
+    packed = PackedMapping.open(tmp_path / "mapping")
+
+    assert dict(packed) == mapping
+    assert list(packed) == sorted(mapping)
+    assert all(type(packed[key]) is type(value) for key, value in mapping.items())
+    assert "missing" not in packed
+    with pytest.raises(KeyError):
+        packed["missing"]
+    with pytest.raises(KeyError):
+        packed[1]
+
+
+def test_integer_values_are_an_array(tmp_path):
+    PackedMapping.write(tmp_path / "mapping", {"a": 1})
+
+    assert isinstance(PackedMapping.open(tmp_path / "mapping").values_table, np.ndarray)
+
+
+def test_built_packed_mapping_saves(tmp_path):
+    mapping = {"b": "two", "a": "one"}
+    PackedMapping.build(mapping).save(tmp_path / "mapping")
+
+    assert dict(PackedMapping.open(tmp_path / "mapping")) == mapping
+
+
+def test_packed_set_round_trip(tmp_path):
+    values = {"stop", "the", "a", "é"}
+    PackedSet.write(tmp_path / "set", values)
+    packed = PackedSet(StringTable(tmp_path / "set"))
+
+    assert set(packed) == values
+    assert len(packed) == len(values)
+    assert "the" in packed
+    assert "then" not in packed
+    assert 1 not in packed
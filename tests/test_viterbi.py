@@ -0,0 +1,74 @@
+import random
+
+import pytest
+from sklearn_crfsuite import CRF
+
+from src.viterbi import CRFTables
+
+WORDS = {
+    "B-room": ["kitchen", "bedroom", "garage"],
+    "B-color": ["red", "blue", "green"],
+    "I-color": ["ish", "dark"],
+    "O": ["turn", "the", "lights", "to", "in", "on", "make"],
+}
+VOCABULARY = {word: tag for tag, words in WORDS.items() for word in words}
+
+
+def features(words):
+    """Token features with the string and numeric values crfsuite accepts."""
+    return [
+        {
+            "word": word,
+            "suffix": word[-2:],
+            "length": len(word) / 10,
+            "first": float(i == 0),
+            **({"previous": words[i - 1]} if i else {}),
+        }
+        for i, word in enumerate(words)
+    ]
+
+
+def sentence(rng, length):
+    words = [rng.choice(list(VOCABULARY)) for _ in range(length)]
+    tags = []
+    for word in words:
+        tag = VOCABULARY[word]
+        # Some inside tags only follow their beginning, which makes transitions matter
+        if tag == "I-color" and (not tags or tags[-1] not in ("B-color", "I-color")):
+            tag = "O"
+        tags.append(tag)
+    return words, tags
+
+
+@pytest.fixture(scope="module")
+def crf():
+    rng = random.Random(0)
+    sentences = [sentence(rng, rng.randint(1, 8)) for _ in range(200)]
+    model = CRF(algorithm="lbfgs", c1=0.1, c2=0.1, max_iterations=50)
+    model.fit([features(words) for words, _ in sentences], [t for _, t in sentences])
+    return model
+
+
+def test_decodes_like_the_tagger(crf):
+    tables = CRFTables(crf)
+    rng = random.Random(1)
+    # Of different lengths, so that the batch is padded
+    batch = [features(sentence(rng, rng.randint(1, 12))[0]) for _ in range(100)]
+
+    decoded = tables.decode([tables.emissions(sequence) for sequence in batch])
+
+    assert decoded == [crf.tagger_.tag(sequence) for sequence in batch]
+
+
+def test_decodes_a_single_token(crf):
+    tables = CRFTables(crf)
+    sequence = features(["kitchen"])
+
+    assert tables.decode([tables.emissions(sequence)]) == [crf.tagger_.tag(sequence)]
+
+
+def test_ignores_unknown_attributes(crf):
+    tables = CRFTables(crf)
+    sequence = features(["unknown", "kitchen"])
+
+    assert tables.decode([tables.emissions(sequence)]) == [crf.tagger_.tag(sequence)]